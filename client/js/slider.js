@@ -3,8 +3,8 @@ class Slider extends Base {
         super();
         this._image = image;
         this._key = key;
-        this._rangeUrl = '/?image=range&range={range}&pos={position}&key=' + key;
-        this._nextUrl = '/?image=next&step={step}&pos={position}&key=' + key;
+        this._rangeUrl = '/?image=range&range={range}&pos={position}&w={width}&key=' + key;
+        this._nextUrl = '/?image=next&step={step}&pos={position}&w={width}&key=' + key;
         this._position = '';
         this._lock = false;
         this._loading = false;
@@ -48,9 +48,14 @@ class Slider extends Base {
             url = url.replace('{' + key + '}', args[key]);
         }
         url = url.replace('{position}', this._position);
+        url = url.replace('{width}', this._getWidth());
         return url;
     }
 
+    _getWidth = () => { // in device pixels, the server returns a downscaled image if it's smaller
+        return Math.round((this._image.clientWidth || window.innerWidth) * (window.devicePixelRatio || 1));
+    }
+
     _fetch = (url, args, callback = null, force = false) => {
         if (!force && this._loading) {
             return;
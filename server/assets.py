@@ -0,0 +1,76 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+
+import const
+
+try:
+    import brotli  # optional
+except ImportError:
+    brotli = None
+
+
+class Assets:
+    """ Static files table, filled lazily and refreshed when a file is modified.
+        Each asset keeps the strong ETag and precompressed (gzip, brotli) bodies of text files.
+    """
+    COMPRESSIBLE_TYPES = (
+        'text/', 'application/javascript', 'application/json', 'application/manifest+json', 'image/svg+xml')
+
+    _items = {}  # uri: asset
+
+    @staticmethod
+    def get(uri: str) -> dict:
+        """ Asset by URI: {"mime", "etag", "mtime", "bodies": {encoding: body}}.
+            "identity" body is always present.
+        """
+        path = f'{const.CLIENT_PATH}{uri}'
+        if not os.path.isfile(path):
+            raise RuntimeError('Web: invalid static file', 404)
+
+        mtime = os.stat(path).st_mtime
+        asset = Assets._items.get(uri)
+        if not asset or asset['mtime'] != mtime:
+            asset = Assets._load(path, mtime)
+            Assets._items[uri] = asset
+        return asset
+
+    @staticmethod
+    def get_encoding(asset: dict, accept_encoding: str) -> str:
+        """ The best encoding of the asset accepted by client """
+        accepted = [e.split(';', 1)[0].strip() for e in accept_encoding.lower().split(',')]
+        for encoding in ('br', 'gzip'):
+            if encoding in asset['bodies'] and encoding in accepted:
+                return encoding
+        return 'identity'
+
+    @staticmethod
+    def get_etag(asset: dict, encoding: str) -> str:
+        """ Strong ETag of the representation (differs for each content encoding) """
+        return f'"{asset["etag"]}"' if encoding == 'identity' else f'"{asset["etag"]}-{encoding}"'
+
+    @staticmethod
+    def is_not_modified(asset: dict, encoding: str, if_none_match: str) -> bool:
+        """ The client has the representation of the chosen encoding """
+        tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return '*' in tags or Assets.get_etag(asset, encoding) in tags
+
+    @staticmethod
+    def _load(path: str, mtime: float) -> dict:
+        with open(path, 'rb') as file:
+            body = file.read()
+
+        mime_type, _enc = mimetypes.guess_type(path)
+        bodies = {'identity': body}
+        if mime_type and mime_type.startswith(Assets.COMPRESSIBLE_TYPES):
+            bodies['gzip'] = gzip.compress(body, 9, mtime=0)
+            if brotli:
+                bodies['br'] = brotli.compress(body)
+
+        return {
+            'mime': mime_type,
+            'etag': hashlib.sha1(body).hexdigest()[:16],
+            'mtime': mtime,
+            'bodies': bodies,
+        }
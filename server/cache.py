@@ -0,0 +1,69 @@
+import asyncio
+from collections import OrderedDict
+
+
+class Cache:
+    """ In-memory LRU cache of the live segments shared by all web clients.
+        Limited by total size and by the number of segments per camera:
+        the new live segment of the camera supersedes the oldest one.
+    """
+    MAX_SIZE = 67108864  # bytes
+    MAX_CAMERA_SEGMENTS = 3
+
+    _items = OrderedDict()  # path: (camera key, size, loading task), size is 0 until loaded
+    _cameras = {}  # camera key: [paths]
+    _size = 0  # bytes of the loaded segments
+
+    @staticmethod
+    async def get(cam_key: str, path: str) -> bytes:
+        """ Segment content. Concurrent requests for the same segment share one disk read.
+        """
+        if path in Cache._items:
+            Cache._items.move_to_end(path)
+            task = Cache._items[path][2]
+        else:
+            task = asyncio.ensure_future(asyncio.to_thread(Cache._read_file, path))
+            task.add_done_callback(lambda t: Cache._on_load(path, t))
+            Cache._add(cam_key, path, task)
+
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            Cache._remove(path)
+            raise
+
+    @staticmethod
+    def _add(cam_key: str, path: str, task: asyncio.Future) -> None:
+        Cache._items[path] = (cam_key, 0, task)
+        paths = Cache._cameras.setdefault(cam_key, [])
+        paths.append(path)
+        while len(paths) > Cache.MAX_CAMERA_SEGMENTS:
+            Cache._remove(paths[0])
+
+    @staticmethod
+    def _on_load(path: str, task: asyncio.Future) -> None:
+        """ Count the loaded content size and evict the least recently used segments if the cache is full """
+        item = Cache._items.get(path)
+        if not item or item[2] is not task or task.cancelled() or task.exception():
+            return
+        size = len(task.result())
+        Cache._items[path] = (item[0], size, task)
+        Cache._size += size
+
+        while Cache._size > Cache.MAX_SIZE and len(Cache._items) > 1:
+            Cache._remove(next(iter(Cache._items)))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        item = Cache._items.pop(path, None)
+        if not item:
+            return
+        Cache._size -= item[1]
+        paths = Cache._cameras.get(item[0], [])
+        if path in paths:
+            paths.remove(path)
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, 'rb') as file:
+            return file.read()
@@ -0,0 +1,140 @@
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+import fs
+from _config import Config
+
+
+class Catalog:
+    """ Long-lived index of the camera event images shared by all web requests.
+        Each folder of the camera events path is listed once and kept as sorted names with parallel sizes.
+        While Events keeps the catalog up to date ("synced"), folders are never re-listed by requests,
+        otherwise a folder is re-listed only when its modification time is changed.
+        Uploaded images are pushed by Watcher, the listeners (Events) are notified at once.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cam_key: str):
+        self._key = cam_key
+        self._events_path = f"{Config.events_path}/{Config.cameras[self._key]['folder']}"
+        self._lock = threading.Lock()
+        self._folders = []
+        self._folders_mtime = 0
+        self._files = {}  # folder: (mtime, [names], array('q') sizes)
+        self.watched = False  # True if Watcher watches the live folder of the camera
+        self.synced = False  # True if Events adds new images to the catalog
+        self._listeners = []  # [callback(folder, name, mtime, is_new, previous folder mtime, folder mtime)]
+
+    @staticmethod
+    def get(cam_key: str) -> 'Catalog':
+        """ Shared catalog instance for the camera """
+        with Catalog._instances_lock:
+            if cam_key not in Catalog._instances:
+                Catalog._instances[cam_key] = Catalog(cam_key)
+            return Catalog._instances[cam_key]
+
+    def get_folders(self) -> list[str]:
+        """ Sorted folders of the camera events path """
+        with self._lock:
+            mtime = self._get_mtime(self._events_path)
+            if mtime != self._folders_mtime:
+                self._folders = fs.list_dir(self._events_path)
+                self._folders_mtime = mtime
+                for folder in set(self._files) - set(self._folders):  # deleted (e.g. by the retention)
+                    del self._files[folder]
+            return self._folders
+
+    def get_count(self, folder: str) -> int:
+        with self._lock:
+            return len(self._get_files(folder)[1])
+
+    def get_file(self, folder: str, position: int) -> tuple[int, str]:
+        """ (size, name) of the folder file at position (negative counts from the end) """
+        with self._lock:
+            _mtime, names, sizes = self._get_files(folder)
+            return sizes[position], names[position]
+
+    def scan(self, folder: str) -> tuple[list[str], int, int]:
+        """ Re-list the folder if it's modified.
+            Returns names of the new files, previous and current modification times of the folder.
+        """
+        with self._lock:
+            prev_mtime, names, _sizes = self._files.get(folder, (0, [], None))
+            mtime = self._get_mtime(f'{self._events_path}/{folder}')
+            if folder in self._files and mtime == prev_mtime:
+                return [], prev_mtime, prev_mtime
+            known = set(names)
+            mtime, names, _sizes = self._load(folder)
+            return [name for name in names if name not in known], prev_mtime, mtime
+
+    def close(self, folder: str, name: str) -> None:
+        """ The image is uploaded (or rewritten) to the folder (called by Watcher) """
+        path = f'{self._events_path}/{folder}'
+        try:
+            stat = os.stat(f'{path}/{name}')
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            if folder in self._files:
+                prev_mtime, names, sizes = self._files[folder]
+                i = bisect_left(names, name)
+                is_new = i == len(names) or names[i] != name
+                if is_new:
+                    names.insert(i, name)
+                    sizes.insert(i, stat.st_size)
+                else:
+                    sizes[i] = stat.st_size
+                self._files[folder] = (self._get_mtime(path), names, sizes)
+            else:
+                prev_mtime, is_new = 0, True
+                self._load(folder)
+            mtime = self._files[folder][0]
+
+        for callback in self._listeners:
+            callback(folder, name, stat.st_mtime, is_new, prev_mtime, mtime)
+
+    def refresh(self, folder: str) -> None:
+        """ Push the loaded folder files missing in the catalog (e.g. uploaded before the folder was watched) """
+        names = {name for _size, name in fs.list_files(f'{self._events_path}/{folder}')}
+        with self._lock:
+            if folder not in self._files:
+                return  # will be listed when requested
+            missing = names - set(self._files[folder][1])
+        for name in sorted(missing):
+            self.close(folder, name)
+
+    def add_listener(self, callback) -> None:
+        """ Call "callback(folder, name, mtime, is_new, previous folder mtime, folder mtime)" for each uploaded image
+        """
+        self._listeners.append(callback)
+
+    def reset(self) -> None:
+        """ Forget everything (e.g. folders are rotated or deleted) """
+        with self._lock:
+            self._folders_mtime = 0
+            self._files = {}
+
+    def _get_files(self, folder: str) -> tuple[int, list[str], array]:
+        """ Called under the lock """
+        if folder in self._files:
+            if self.synced or self._files[folder][0] == self._get_mtime(f'{self._events_path}/{folder}'):
+                return self._files[folder]
+        return self._load(folder)
+
+    def _load(self, folder: str) -> tuple[int, list[str], array]:
+        path = f'{self._events_path}/{folder}'
+        mtime = self._get_mtime(path)
+        files = fs.list_files(path)
+        self._files[folder] = (mtime, [f[1] for f in files], array('q', (f[0] for f in files)))
+        return self._files[folder]
+
+    @staticmethod
+    def _get_mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
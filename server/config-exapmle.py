@@ -8,9 +8,14 @@ class Config:
     #    * "codecs": RFC 6381 information about video/audio codecs (part of Media Source type),
     #       for example: "hev1.1.6.L120.0" (H.265), "avc1.42E01E, mp4a.40.2" (H.264 with audio channel).
     #    * "storage_command": can overwrite common command (set UDP mode here, enable audio channel, etc.).
-    #    * "sensitivity" is used as threshold value for the Motion Detector.
+    #    * "sensitivity" is used as threshold value for the Motion Detector (segment size / average size).
     #       Must be more than 1. Set to 0 to disable.
+    #    * "z_score" (optional, 3 by default): the second threshold of the Motion Detector,
+    #       standard deviations of the segment size above the average. Increase it to reduce false alarms.
     #    * "events": set to True if hardware Motion Detection is configured for this camera.
+    #    * "weight" (optional, 1 by default): the camera share of "storage_quota_gb".
+    #       For example, set 2 for a high bitrate camera to keep the same archive depth as others.
+    #       Set to 0 to exclude the camera from the quota eviction.
     #
     cameras = {
         'some-URL-compatible-string/including-UTF-characters': {
@@ -20,6 +25,7 @@ class Config:
             'storage_command': '',
             'sensitivity': 1.5,
             'events': False,
+            'weight': 1,
         },
     }
 
@@ -49,6 +55,14 @@ class Config:
     # All files and subdirectories older than events_period_days in this folder will be deleted!
     events_path = '/<path>'
 
+    # Built-in FTP server for the cameras snapshots (passive mode, upload only), instead of an external one.
+    # Each camera must upload into its "folder", images are saved to the day folders: events_path/folder/YYYY-mm-dd.
+    # Set the port (for example, 2121) to enable.
+    ftp_server_host = '0.0.0.0'
+    ftp_server_port = 0
+    ftp_user = ''
+    ftp_password = ''
+
     # {url} = cameras[key].url
     # {cam_path} = storage_path/cameras[key].folder
     # Add "-c:a aac" option here if all the cameras support audio channels.
@@ -60,6 +74,16 @@ class Config:
     storage_period_days = 3
     events_period_days = 30
 
+    # Keep the storage disk usage under this limit, % (int).
+    # The oldest minutes of all the cameras are deleted first, regardless of "storage_period_days".
+    # Set to 0 to disable.
+    storage_max_usage = 90
+
+    # Total size of the video storage of all cameras, GB (int or float).
+    # When exceeded, the oldest minutes of the camera with the largest overrun of its share are deleted first.
+    # Set to 0 to disable.
+    storage_quota_gb = 0
+
     # Debug options
     storage_enabled = True
     events_enabled = True
@@ -1,6 +1,10 @@
+from os import path as os_path
+
 DT_ROOT_FORMAT = '%Y-%m-%d'
 DT_PATH_FORMAT = '%Y-%m-%d/%H/%M'
 DT_WEB_FORMAT = '%Y%m%d%H%M%S'
 
 MAX_RANGE = 2000
 MIN_FILE_SIZE = 1000
+
+CLIENT_PATH = f'{os_path.dirname(os_path.realpath(__file__))}/../client'
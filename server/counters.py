@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import fs
+from _config import Config
+from log import log
+
+
+class Counters:
+    """ Per-folder (day) and per-hour counts of the camera event images for the events chart.
+        Counts are persisted with the folders modification times in the hidden folder of events_path
+        (outside of the image folders), so only the folders modified while the server was stopped are recounted.
+        The live folder counts are incremented by Events as new images arrive.
+    """
+    FOLDER = '.counters'
+    SAVE_INTERVAL = 60  # secs
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cam_key: str):
+        self._key = cam_key
+        self._events_path = f"{Config.events_path}/{Config.cameras[self._key]['folder']}"
+        self._file_path = f"{Config.events_path}/{self.FOLDER}/{Config.cameras[self._key]['folder']}.json"
+        self._lock = threading.Lock()
+        self._folders = None  # folder: {"mtime": ns, "hours": [24 counts]}, loaded lazily
+        self._changed = False
+        self._saved_at = 0.0
+
+    @staticmethod
+    def get(cam_key: str) -> 'Counters':
+        """ Shared counters instance for the camera """
+        with Counters._instances_lock:
+            if cam_key not in Counters._instances:
+                Counters._instances[cam_key] = Counters(cam_key)
+            return Counters._instances[cam_key]
+
+    def get_daily(self, folders: list[str]) -> list[int]:
+        """ Number of images in each folder """
+        return [sum(hours) for hours in self.get_hourly(folders)]
+
+    def get_hourly(self, folders: list[str]) -> list[list[int]]:
+        """ Number of images in each folder by hours (of the images modification time) """
+        with self._lock:
+            self._load()
+            out = [self._get_hours(folder)[:] for folder in folders]
+            for folder in set(self._folders) - set(folders):  # deleted
+                del self._folders[folder]
+                self._changed = True
+        self.save()
+        return out
+
+    def add(self, folder: str, mtimes: list[float], prev_mtime: int, mtime: int) -> None:
+        """ New images of the folder (their modification times).
+            "prev_mtime" and "mtime" are the folder modification times before and after the images are added,
+            the folder is recounted if the counts don't match "prev_mtime".
+            Unknown "prev_mtime" (0) is ignored: the persisted counts are checked against the folder mtime when read.
+        """
+        if not prev_mtime:
+            return
+        with self._lock:
+            self._load()
+            item = self._folders.get(folder)
+            if not item or item['mtime'] != prev_mtime:
+                self._folders.pop(folder, None)  # will be recounted
+                return
+            for image_mtime in mtimes:
+                item['hours'][datetime.fromtimestamp(image_mtime).hour] += 1
+            item['mtime'] = mtime
+            self._changed = True
+
+    def reset(self) -> None:
+        """ Recount all folders (e.g. they are rotated) """
+        with self._lock:
+            self._folders = {}
+            self._changed = True
+
+    def save(self, force: bool = False) -> None:
+        """ Write the counts file if they are changed, not often than SAVE_INTERVAL secs """
+        with self._lock:
+            if not self._changed or (not force and time.monotonic() - self._saved_at < self.SAVE_INTERVAL):
+                return
+            data = json.dumps(self._folders)
+            self._changed = False
+            self._saved_at = time.monotonic()
+
+        try:
+            fs.make_dirs(os.path.dirname(self._file_path))
+            with open(f'{self._file_path}.tmp', 'w') as file:
+                file.write(data)
+            os.replace(f'{self._file_path}.tmp', self._file_path)
+        except OSError as e:
+            log(f"Counters: can't save {self._key} ({repr(e)})", True)
+
+    def _load(self) -> None:
+        """ Called under the lock """
+        if self._folders is not None:
+            return
+        try:
+            with open(self._file_path) as file:
+                self._folders = json.load(file)
+        except FileNotFoundError:
+            self._folders = {}
+        except (OSError, ValueError) as e:
+            log(f"Counters: can't load {self._key} ({repr(e)})", True)
+            self._folders = {}
+
+    def _get_hours(self, folder: str) -> list[int]:
+        """ Called under the lock """
+        path = f'{self._events_path}/{folder}'
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return [0] * 24
+        item = self._folders.get(folder)
+        if item and item['mtime'] == mtime:
+            return item['hours']
+
+        hours = [0] * 24
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    hours[datetime.fromtimestamp(entry.stat().st_mtime).hour] += 1
+        self._folders[folder] = {'mtime': mtime, 'hours': hours}
+        self._changed = True
+        return hours
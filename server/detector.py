@@ -0,0 +1,53 @@
+import math
+
+
+class Detector:
+    """ Streaming bitrate motion detector of one camera.
+        Motion makes the segments bigger. Each closed segment size is compared with the exponentially weighted
+        mean & variance of the previous ones, so slow drifts (dawn, dusk, clouds) are followed by the baseline
+        while sudden jumps are reported. Detected (outlier) sizes are clamped before they get into the baseline.
+    """
+    WINDOW = 16  # number of the first sizes the baseline is seeded from
+    WEIGHT = 0.1  # EWMA smoothing factor
+    Z_SCORE = 3.0  # default threshold, standard deviations above the mean
+    MIN_DEVIATION = 0.05  # share of the mean, for the static scenes with almost constant bitrate
+
+    def __init__(self, sensitivity: float, z_score: float = Z_SCORE):
+        self._sensitivity = sensitivity  # size / mean threshold
+        self._z_score = z_score if z_score > 0 else self.Z_SCORE  # 0 would freeze the baseline (see clamping)
+        self._warmup = []  # the first sizes, dropped after seeding
+        self._seeded = False
+        self._mean = 0.0
+        self._variance = 0.0
+
+    def feed(self, size: int) -> float:
+        """ Add the next segment size. Returns the z-score if motion is detected, 0 otherwise.
+        """
+        if not self._seeded:  # warming up
+            self._warmup.append(size)
+            if len(self._warmup) == self.WINDOW:
+                self._seed()
+            return 0.0
+
+        deviation = max(math.sqrt(self._variance), self._mean * self.MIN_DEVIATION, 1.0)
+        z = (size - self._mean) / deviation
+        is_motion = z >= self._z_score and size > self._mean * self._sensitivity
+
+        # Outliers are clamped to keep the baseline
+        value = min(size, self._mean + self._z_score * deviation)
+        diff = value - self._mean
+        self._mean += self.WEIGHT * diff
+        self._variance = (1 - self.WEIGHT) * (self._variance + self.WEIGHT * diff * diff)
+
+        return round(z, 2) if is_motion else 0.0
+
+    def reset(self) -> None:
+        """ Forget the baseline (e.g. the recorder is restarted) """
+        self._warmup = []
+        self._seeded = False
+
+    def _seed(self) -> None:
+        self._mean = sum(self._warmup) / self.WINDOW
+        self._variance = sum((s - self._mean) ** 2 for s in self._warmup) / self.WINDOW
+        self._warmup = []
+        self._seeded = True
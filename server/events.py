@@ -1,11 +1,13 @@
-import re
-import time
+import os
 from datetime import datetime, timedelta
 
 import const
+import fs
 from _config import Config
-from execute import execute_async, execute, get_execute
-from share import Share
+from hub import Hub, MotionEvent
+from retention import Retention
+from catalog import Catalog
+from counters import Counters
 from log import log
 
 
@@ -18,42 +20,56 @@ class Events:
         self._events_path = f"{Config.events_path}/{self._cam_config['folder']}"
         self._last_event = ''
         self._last_rotation_date = ''
-        self._root_folders = []
+        self._catalog = Catalog.get(self._hash)
+        self._catalog.synced = True
+        self._counters = Counters.get(self._hash)
+        self._catalog.add_listener(self._on_image)
 
     def check(self) -> None:
-        """ Check camera events (motion detector) and rotate folders
+        """ Check camera events (motion detector) and rotate folders, called by the scheduler
         """
-        log(f'* Events: start handling {self._hash}')
-        while True:
-            time.sleep(self.CHECK_INTERVAL_SEC)
-            try:
-                self._rotate()
-                self._check()
-            except Exception as e:
-                log(f"Events: can't handle {self._hash} ({repr(e)})", True)
+        self._rotate()
+        if not self._catalog.watched or not self._last_event:  # initial state or no Watcher
+            self._check()
+        self._counters.save()
 
     def _check(self) -> None:
-        folders = self._get_root_folders()
+        folders = self._catalog.get_folders()
         if not folders:
             return
-        live_path = f'{self._events_path}/{folders[-1]}'
-
-        last_event_iso = get_execute(f'ls --full-time {live_path} | tail -1 | awk ' + "'{print $6,$7}'")
-        # example: 2024-05-18 10:49:33.898542994
-        no_milliseconds = re.sub(r'\.[^.]+$', '', last_event_iso)  # remove milliseconds
-        last_event_digits = re.sub(r'\D', '', no_milliseconds)  # remove all non-digit characters
-        if not last_event_digits:
+        new_files, prev_mtime, folder_mtime = self._catalog.scan(folders[-1])
+        if new_files and prev_mtime:  # not the initial listing, Counters check the folder mtime themselves
+            self._counters.add(folders[-1], self._get_mtimes(folders[-1], new_files), prev_mtime, folder_mtime)
+        if not self._catalog.get_count(folders[-1]):
             return
+        _size, name = self._catalog.get_file(folders[-1], -1)
+        try:
+            mtime = os.stat(f'{self._events_path}/{folders[-1]}/{name}').st_mtime
+        except FileNotFoundError:
+            return
+        self._publish(mtime, not self._last_event)
+
+    def _on_image(
+            self, folder: str, _name: str, mtime: float, is_new: bool, prev_mtime: int, folder_mtime: int) -> None:
+        """ Uploaded image (Catalog listener) """
+        if is_new:
+            self._counters.add(folder, [mtime], prev_mtime, folder_mtime)
+        self._publish(mtime)
+
+    def _publish(self, mtime: float, initial: bool = False) -> None:
+        last_event_digits = datetime.fromtimestamp(mtime).strftime(const.DT_WEB_FORMAT)
         if self._last_event and last_event_digits <= self._last_event:
             return
 
-        Share.cam_motions[self._hash] = last_event_digits
-        if not self._last_event:
+        event = MotionEvent(self._hash, last_event_digits, 'events', 0)
+        if initial:  # initial state, nothing to notify
+            Hub.publish(event, False)
             self._last_event = last_event_digits
             return
 
         self._last_event = last_event_digits
-        log(f'Events: motion detected: {no_milliseconds[11:]} {self._hash}')
+        Hub.publish(event)
+        log(f'Events: motion detected: {datetime.fromtimestamp(mtime).strftime("%H:%M:%S")} {self._hash}')
 
     def _rotate(self) -> None:
         now_date = datetime.now().strftime(const.DT_ROOT_FORMAT)
@@ -66,48 +82,60 @@ class Events:
         # Rotation
         yesterday_folder = (datetime.now() - timedelta(days=1)).strftime(const.DT_ROOT_FORMAT)
 
-        folders = self._get_root_folders()
+        folders = self._catalog.get_folders()
         if not folders:
             return
+        # dated folders (e.g. uploaded by Ftp) are already in place
+        if self._is_dated(folders[-1]):
+            return
+
         live_path = f'{self._events_path}/{folders[-1]}'
 
         # check live folder is empty
-        if not get_execute(f"[ '$(ls -A {live_path})' ] && echo 1 || echo ''"):
+        if not fs.list_dir(live_path):
             return
 
         # check yesterday folder exists
-        if get_execute(f'test -d {self._events_path}/{yesterday_folder} && echo 1'):
+        if os.path.isdir(f'{self._events_path}/{yesterday_folder}'):
             return
 
-        execute(
-            f'mkdir -p {self._events_path}/{yesterday_folder} '
-            f'&& mv {live_path}/* {self._events_path}/{yesterday_folder}')
+        fs.make_dirs(f'{self._events_path}/{yesterday_folder}')
+        fs.move_all(live_path, f'{self._events_path}/{yesterday_folder}')
+        self._catalog.reset()
+        self._counters.reset()
 
         log(f'Events: rotation at {now_date} {self._hash}')
 
     def _cleanup(self) -> None:
         oldest_folder = (datetime.now() - timedelta(days=Config.events_period_days)).strftime(const.DT_ROOT_FORMAT)
 
-        ls = get_execute(f'ls -d {self._events_path}/*').splitlines()
+        ls = fs.list_dir(self._events_path)
         if not ls:
             return
 
         cnt = len(ls)
-        for row in ls:
-            wd = row.split('/')[-1]
-            if not wd or wd >= oldest_folder or cnt <= Config.events_period_days:
+        for wd in ls:
+            if wd >= oldest_folder or cnt <= Config.events_period_days:
                 break
-            execute_async(f'rm -rf {self._events_path}/{wd}')
+            Retention.delete(f'{self._events_path}/{wd}')
             cnt -= 1
             log(f'Events cleanup: remove {self._hash} {wd}')
 
         log(f'Events: cleanup done {self._hash}')
 
-    def _get_root_folders(self) -> list[str]:
-        if self._root_folders:
-            return self._root_folders
-        ls = get_execute(f'ls {self._events_path}').splitlines()
-        if not ls:
-            return self._root_folders
-        self._root_folders = ls
-        return self._root_folders
+    @staticmethod
+    def _is_dated(folder: str) -> bool:
+        try:
+            datetime.strptime(folder, const.DT_ROOT_FORMAT)
+        except ValueError:
+            return False
+        return True
+
+    def _get_mtimes(self, folder: str, names: list[str]) -> list[float]:
+        mtimes = []
+        for name in names:
+            try:
+                mtimes.append(os.stat(f'{self._events_path}/{folder}/{name}').st_mtime)
+            except FileNotFoundError:
+                pass
+        return mtimes
@@ -0,0 +1,93 @@
+"""
+Storage I/O helpers (pure Python, no shell commands).
+Slow recursive deletions are executed in the background worker thread.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from log import log
+
+_executor = ThreadPoolExecutor(1, thread_name_prefix='fs')
+
+
+def make_dirs(path: str) -> None:
+    """ mkdir -p
+    """
+    os.makedirs(path, exist_ok=True)
+
+
+def list_dir(path: str) -> list[str]:
+    """ Sorted names of folder entries except hidden ones (like "ls"), empty list if the folder doesn't exist
+    """
+    try:
+        return sorted(name for name in os.listdir(path) if not name.startswith('.'))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def list_files(path: str) -> list[tuple[int, str]]:
+    """ Files of the folder except hidden ones as [(size, name)] sorted by name
+    """
+    files = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    files.append((entry.stat().st_size, entry.name))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return sorted(files, key=lambda f: f[1])
+
+
+def remove_dir_if_empty(path: str) -> bool:
+    """ Returns False if the folder is not empty
+    """
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return False
+    return True
+
+
+def move_all(src: str, dst: str) -> None:
+    """ mv src/* dst
+    """
+    for name in list_dir(src):
+        os.replace(f'{src}/{name}', f'{dst}/{name}')
+
+
+def delete_small_files(path: str, min_size: int) -> None:
+    """ find path -type f -size -{min_size}c -delete (except hidden files)
+    """
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            if name.startswith('.'):
+                continue
+            file_path = f'{root}/{name}'
+            try:
+                if os.stat(file_path).st_size < min_size:
+                    os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+
+def delete_empty_dirs(path: str) -> None:
+    """ find path -type d -empty -delete
+    """
+    for root, _dirs, _files in os.walk(path, topdown=False):
+        remove_dir_if_empty(root)
+
+
+def run_async(func, *args) -> Future:
+    """ Run "func" in the background worker and DON'T wait until it finishes
+    """
+    future = _executor.submit(func, *args)
+    future.add_done_callback(_log_error)
+    return future
+
+
+def _log_error(future: Future) -> None:
+    if future.exception():
+        log(f'fs: {repr(future.exception())}', True)
@@ -0,0 +1,194 @@
+import asyncio
+import hmac
+import os
+import posixpath
+from datetime import datetime
+
+import const
+import fs
+from _config import Config
+from catalog import Catalog
+from log import log
+
+
+class Ftp:
+    """ Minimal built-in FTP server for the cameras snapshots: passive mode, upload (STOR) only.
+        The virtual root is events_path, each camera uploads into its "folder" (any subfolders are ignored).
+        Images are saved to the day folder of the camera and pushed to the Catalog as soon as the upload is completed,
+        so the motion event is published without any filesystem polling.
+    """
+    IDLE_TIMEOUT = 60  # secs
+    DATA_TIMEOUT = 10  # secs, waiting for the passive data connection
+    MAX_FILE_SIZE = 16777216  # bytes
+    CHUNK_SIZE = 65536  # bytes
+
+    def __init__(self):
+        self._folders = {cfg['folder']: key for key, cfg in Config.cameras.items()}
+
+    async def run(self) -> None:
+        """ Infinite loop for uploads
+        """
+        host = getattr(Config, 'ftp_server_host', '0.0.0.0')
+        port = getattr(Config, 'ftp_server_port', 0)
+        server = await asyncio.start_server(self._handle, host, port)
+        log(f'* Ftp: serving on ftp://{host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = {'user': '', 'logged_in': False, 'cwd': '/', 'passive': None}
+        peer = writer.get_extra_info('peername')[0]
+        try:
+            await self._reply(writer, 220, 'Ready')
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+                if not line:
+                    break
+                cmd, _sp, arg = line.decode(errors='replace').strip().partition(' ')
+                if not await self._command(session, writer, cmd.upper(), arg.strip(), peer):
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            log(f'Ftp: {peer} ({repr(e)})', True)
+        finally:
+            self._close_passive(session)
+            writer.close()
+
+    async def _command(self, session: dict, writer: asyncio.StreamWriter, cmd: str, arg: str, peer: str) -> bool:
+        """ Returns False if the connection must be closed """
+        if cmd == 'USER':
+            session['user'] = arg
+            await self._reply(writer, 331, 'Password required')
+        elif cmd == 'PASS':
+            if self._is_valid_user(session['user'], arg):
+                session['logged_in'] = True
+                await self._reply(writer, 230, 'Logged in')
+            else:
+                log(f'Ftp: invalid login from {peer}', True)
+                await self._reply(writer, 530, 'Login incorrect')
+                return False
+        elif cmd == 'QUIT':
+            await self._reply(writer, 221, 'Bye')
+            return False
+        elif cmd in ('SYST', 'FEAT', 'NOOP', 'OPTS', 'TYPE', 'MODE', 'STRU'):
+            await self._reply(writer, 215 if cmd == 'SYST' else 200, 'UNIX Type: L8' if cmd == 'SYST' else 'OK')
+        elif not session['logged_in']:
+            await self._reply(writer, 530, 'Not logged in')
+        elif cmd == 'PWD':
+            await self._reply(writer, 257, f'"{session["cwd"]}"')
+        elif cmd in ('CWD', 'CDUP'):
+            session['cwd'] = self._get_path(session['cwd'], arg if cmd == 'CWD' else '..')
+            await self._reply(writer, 250, 'OK')
+        elif cmd == 'MKD':  # folders are virtual
+            await self._reply(writer, 257, f'"{self._get_path(session["cwd"], arg)}" created')
+        elif cmd in ('PASV', 'EPSV'):
+            await self._passive(session, writer, cmd == 'EPSV')
+        elif cmd == 'STOR':
+            await self._store(session, writer, arg, peer)
+        else:
+            await self._reply(writer, 502, 'Not implemented')
+        return True
+
+    async def _passive(self, session: dict, writer: asyncio.StreamWriter, extended: bool) -> None:
+        self._close_passive(session)
+        host = writer.get_extra_info('sockname')[0].removeprefix('::ffff:')
+        if not extended and ':' in host:
+            return await self._reply(writer, 425, 'Use EPSV')
+
+        future = asyncio.get_running_loop().create_future()
+
+        def on_connect(data_reader: asyncio.StreamReader, data_writer: asyncio.StreamWriter) -> None:
+            if future.done():
+                data_writer.close()
+            else:
+                future.set_result((data_reader, data_writer))
+
+        server = await asyncio.start_server(on_connect, host, 0)
+        session['passive'] = (server, future)
+        port = server.sockets[0].getsockname()[1]
+        if extended:
+            await self._reply(writer, 229, f'Entering Extended Passive Mode (|||{port}|)')
+        else:
+            await self._reply(writer, 227, f'Entering Passive Mode ({host.replace(".", ",")},{port >> 8},{port & 255})')
+
+    async def _store(self, session: dict, writer: asyncio.StreamWriter, arg: str, peer: str) -> None:
+        path = self._get_path(session['cwd'], arg)
+        parts = path.strip('/').split('/')
+        name = parts[-1]
+        if len(parts) < 2 or parts[0] not in self._folders or not name or name.startswith('.'):
+            return await self._reply(writer, 553, 'Invalid camera folder or file name')
+        if not session['passive']:
+            return await self._reply(writer, 425, 'Use PASV first')
+
+        server, future = session['passive']
+        await self._reply(writer, 150, 'Ready')
+        try:
+            data_reader, data_writer = await asyncio.wait_for(future, self.DATA_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._close_passive(session)
+            return await self._reply(writer, 425, "Can't open data connection")
+        finally:
+            server.close()
+            session['passive'] = None
+
+        key = self._folders[parts[0]]
+        day = datetime.now().strftime(const.DT_ROOT_FORMAT)
+        folder_path = f'{Config.events_path}/{parts[0]}/{day}'
+        fs.make_dirs(folder_path)
+        tmp_path = f'{folder_path}/.{name}.part'
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as file:
+                while chunk := await asyncio.wait_for(data_reader.read(self.CHUNK_SIZE), self.IDLE_TIMEOUT):
+                    size += len(chunk)
+                    if size > self.MAX_FILE_SIZE:
+                        raise ValueError('file is too large')
+                    file.write(chunk)
+            os.replace(tmp_path, f'{folder_path}/{name}')
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            log(f"Ftp: can't save {key} {name} from {peer} ({repr(e)})", True)
+            self._remove(tmp_path)
+            return await self._reply(writer, 451, 'Upload failed')
+        finally:
+            data_writer.close()
+
+        await self._reply(writer, 226, 'Transfer complete')
+        Catalog.get(key).close(day, name)
+
+    @staticmethod
+    def _is_valid_user(user: str, password: str) -> bool:
+        valid_user = getattr(Config, 'ftp_user', '')
+        valid_password = getattr(Config, 'ftp_password', '')
+        if not valid_user or not valid_password:
+            return False
+        return hmac.compare_digest(user.encode(), valid_user.encode()) & hmac.compare_digest(
+            password.encode(), valid_password.encode())
+
+    @staticmethod
+    def _get_path(cwd: str, arg: str) -> str:
+        """ Absolute virtual path, never above the root """
+        return posixpath.normpath(posixpath.join(cwd, arg)) if arg else cwd
+
+    @staticmethod
+    def _close_passive(session: dict) -> None:
+        if session['passive']:
+            server, future = session['passive']
+            server.close()
+            if future.done():
+                future.result()[1].close()
+            else:
+                future.cancel()
+            session['passive'] = None
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    async def _reply(writer: asyncio.StreamWriter, code: int, message: str) -> None:
+        writer.write(f'{code} {message}\r\n'.encode())
+        await writer.drain()
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from collections import deque
+from typing import NamedTuple
+
+
+class MotionEvent(NamedTuple):
+    camera: str  # camera key
+    date_time: str  # DT_WEB_FORMAT
+    source: str  # "storage" (bitrate motion detector) or "events" (camera motion detector)
+    score: float  # detector specific, 0 if unknown
+
+
+class Hub:
+    """ Motion events bus between the detector threads (Storage, Events) and the web server loop.
+        Keeps the last event of each camera and the bounded history of events.
+        Events are handed over to the loop with call_soon_threadsafe and pushed to the queues
+        of SSE clients subscribed to these cameras.
+    """
+    QUEUE_SIZE = 100  # slow client loses the oldest events
+    HISTORY_SIZE = 1000
+
+    loop = None  # web server loop, set on start
+    _lock = threading.Lock()
+    _last = {}  # camera key: MotionEvent
+    _history = deque(maxlen=HISTORY_SIZE)
+    _subscribers = {}  # queue: set of camera keys (loop only)
+
+    @staticmethod
+    def publish(event: MotionEvent, notify: bool = True) -> bool:
+        """ New motion detected (thread safe). Returns False if the camera has the same or newer event.
+            Set "notify" to False to save the event silently (e.g. restored initial state).
+        """
+        with Hub._lock:
+            last = Hub._last.get(event.camera)
+            if last and last.date_time >= event.date_time:
+                return False
+            Hub._last[event.camera] = event
+            Hub._history.append(event)
+
+        if notify and Hub.loop:
+            Hub.loop.call_soon_threadsafe(Hub._dispatch, event)
+        return True
+
+    @staticmethod
+    def get_last(cam_key: str) -> MotionEvent | None:
+        with Hub._lock:
+            return Hub._last.get(cam_key)
+
+    @staticmethod
+    def get_history(cam_key: str = '') -> list[MotionEvent]:
+        """ Recent events (oldest first), of all cameras if "cam_key" is empty """
+        with Hub._lock:
+            return [e for e in Hub._history if not cam_key or e.camera == cam_key]
+
+    @staticmethod
+    def subscribe(cam_keys: set[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(Hub.QUEUE_SIZE)
+        Hub._subscribers[queue] = cam_keys
+        return queue
+
+    @staticmethod
+    def unsubscribe(queue: asyncio.Queue) -> None:
+        Hub._subscribers.pop(queue, None)
+
+    @staticmethod
+    def wake(queue: asyncio.Queue) -> None:
+        """ Interrupt waiting of the subscriber (None is received) """
+        Hub._put(queue, None)
+
+    @staticmethod
+    def _dispatch(event: MotionEvent) -> None:
+        for queue, cam_keys in Hub._subscribers.items():
+            if event.camera in cam_keys:
+                Hub._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, item: MotionEvent | None) -> None:
+        if queue.full():
+            queue.get_nowait()  # back-pressure: drop the oldest event
+        queue.put_nowait(item)
@@ -1,6 +1,7 @@
 import const
 from _config import Config
-from execute import get_execute
+from catalog import Catalog
+from counters import Counters
 
 
 class Images:
@@ -8,15 +9,13 @@ class Images:
         self._hash = camera_hash
         self._cam_config = Config.cameras[self._hash]
         self._events_path = f"{Config.events_path}/{self._cam_config['folder']}"
-        self._root_folders = []
+        self._catalog = Catalog.get(self._hash)
 
-    def get_chart_data(self) -> list[int]:
-        cnt = []
-        for folder in self._get_root_folders():
-            wd = f"{self._events_path}/{folder}"
-            wd_count = get_execute(f'ls {wd} | wc -l')
-            cnt.append(int(wd_count) if wd_count else 0)
-        return cnt
+    def get_chart_data(self, hourly: bool = False) -> list[int] | list[list[int]]:
+        """ Number of images in each folder, or by hours of each folder """
+        counters = Counters.get(self._hash)
+        folders = self._catalog.get_folders()
+        return counters.get_hourly(folders) if hourly else counters.get_daily(folders)
 
     def get(self, args: dict[str, list]) -> tuple[str, int, str, int]:
         position = args['pos'][0].split('.') if 'pos' in args and '.' in args['pos'][0] else [-1, -1]
@@ -38,18 +37,18 @@ class Images:
         folder_idx = int(position[0])
         file_idx = int(position[1])
 
-        folders = self._get_root_folders()
+        folders = self._catalog.get_folders()
         if folder_idx < 0:
             folder_idx = len(folders) - 1
 
-        files = self._get_files(folders[folder_idx])
+        cnt = self._catalog.get_count(folders[folder_idx])
         if file_idx < 0:
-            file_idx = len(files) - 1
+            file_idx = cnt - 1
 
         # try to get file from current folder
-        if (step < 0 and abs(step) <= file_idx) or (0 < step <= len(files) - file_idx - 1):
+        if (step < 0 and abs(step) <= file_idx) or (0 < step <= cnt - file_idx - 1):
             file_idx += step
-            return self._response(folders, files, folder_idx, file_idx)
+            return self._response(folders, folder_idx, file_idx)
 
         if step < 0 and folder_idx <= 0:
             return self._get_first()
@@ -67,45 +66,46 @@ class Images:
 
         return self._get_next(step, [folder_idx, file_idx])
 
-    def _response(self, folders, files, folder_idx, file_idx) -> tuple[str, int, str, int]:
-        if not files:
+    def _response(self, folders, folder_idx, file_idx) -> tuple[str, int, str, int]:
+        folder_idx = min(folder_idx, len(folders) - 1)
+        cnt = self._catalog.get_count(folders[folder_idx])
+        if not cnt:
             return '', 0, '', 0
 
-        file_idx = min(file_idx, len(files) - 1)
-        folder_idx = min(folder_idx, len(folders) - 1)
+        file_idx = min(file_idx, cnt - 1)
 
         range_folder = const.MAX_RANGE / len(folders)
         folder_range = range_folder * folder_idx
 
-        range_file = range_folder / len(files)
+        range_file = range_folder / cnt
         file_range = range_file * file_idx
 
         rng = round(folder_range + file_range)
-        if folder_idx >= len(folders) - 1 and file_idx >= len(files) - 1:
+        if folder_idx >= len(folders) - 1 and file_idx >= cnt - 1:
             rng = const.MAX_RANGE + 1
         elif folder_idx <= 0 and file_idx <= 0:
             rng = -1
 
-        f = files[file_idx].split()
-        return f'{self._events_path}/{folders[folder_idx]}/{f[1]}', int(f[0]), f'{folder_idx}.{file_idx}', rng
+        size, name = self._catalog.get_file(folders[folder_idx], file_idx)
+        return f'{self._events_path}/{folders[folder_idx]}/{name}', size, f'{folder_idx}.{file_idx}', rng
 
     def _get_by_range(self, rng: int, position: list[int]) -> tuple[str, int, str, int]:
         rng = min(max(rng, 0), const.MAX_RANGE - 1)
 
-        folders = self._get_root_folders()
+        folders = self._catalog.get_folders()
         if not folders:
             return '', 0, '', 0
 
         range_folder = int(const.MAX_RANGE / len(folders))
         folder_idx = min(int(rng / range_folder), len(folders) - 1)
 
-        files = self._get_files(folders[folder_idx])
-        file_idx = int((rng / range_folder - folder_idx) * len(files))
+        cnt = self._catalog.get_count(folders[folder_idx])
+        file_idx = int((rng / range_folder - folder_idx) * cnt)
 
         if position[0] == folder_idx and position[1] == file_idx:  # save some traffic
             return '', 0, '', 0
 
-        return self._response(folders, files, folder_idx, file_idx)
+        return self._response(folders, folder_idx, file_idx)
 
     def _get_last(self) -> tuple[str, int, str, int]:
         return self._get_file(-1, const.MAX_RANGE + 1)
@@ -114,26 +114,13 @@ class Images:
         return self._get_file(0, -1)
 
     def _get_file(self, pos: int, rng: int) -> tuple[str, int, str, int]:
-        folders = self._get_root_folders()
+        folders = self._catalog.get_folders()
         if not folders:
             return '', 0, '', rng
         folder = folders[pos]
-        files = self._get_files(folder)
-        if not files and len(folders) > 1:  # fallback case
+        if not self._catalog.get_count(folder) and len(folders) > 1:  # fallback case
             folder = folders[-2]
-            files = self._get_files(folder)
 
-        f = files[pos].split()
-        path = f'{self._events_path}/{folder}/{f[1]}'
-        size = int(f[0])
+        size, name = self._catalog.get_file(folder, pos)
+        path = f'{self._events_path}/{folder}/{name}'
         return path, size, '', rng
-
-    def _get_root_folders(self) -> list[str]:
-        if self._root_folders:
-            return self._root_folders
-        self._root_folders = get_execute(f'ls {self._events_path}').splitlines()
-        return self._root_folders
-
-    def _get_files(self, folder: str) -> list[str]:
-        wd = f"{self._events_path}/{folder}"
-        return get_execute(f'ls -l {wd} | awk ' + "'{print $5,$9}'").splitlines()
@@ -0,0 +1,65 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+# Event masks, see "man 7 inotify"
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+
+class Inotify:
+    """ Minimal ctypes binding to the Linux inotify API (no dependencies)
+    """
+    _EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_init1: {os.strerror(errno)}')
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """ Returns watch descriptor. The same descriptor is returned for the already watched path.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_add_watch: {os.strerror(errno)}', path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self._fd, wd)  # may fail if the folder is already removed
+
+    def read(self, timeout: float | None = None) -> list[tuple[int, int, str]]:
+        """ Wait up to "timeout" secs for events and return them as [(wd, mask, name)]
+        """
+        if timeout is not None and not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos + self._EVENT.size <= len(data):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(data, pos)
+            pos += self._EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0').decode(errors='replace')
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self._fd)
@@ -4,26 +4,59 @@ from _config import Config
 from request import listen_http
 from storage import Storage
 from events import Events
+from watcher import Watcher
+from retention import Retention
+from prober import Prober
+from supervisor import Supervisor
+from scheduler import Scheduler
+from ftp import Ftp
+from segments import Segments
 
 
 def main() -> None:
     tasks = []
+    # All periodic jobs of the cameras share one loop (one thread)
+    scheduler = Scheduler()
 
     if Config.web_enabled:
         # Start one listener for all web clients
         tasks.append(listen_http)
 
+    if Config.web_enabled or Config.storage_enabled:
+        # Initial scan of the archives in the background, requests never wait for it
+        tasks += [Segments.get(camera_key).build for camera_key in Config.cameras.keys()]
+
+    if Config.web_enabled or Config.storage_enabled or Config.events_enabled:
+        # Push closed segments to live clients & the storage watchdogs, uploaded images to Events
+        scheduler.add_service(Watcher().run)
+
+    if Config.events_enabled and getattr(Config, 'ftp_server_port', 0):
+        # Receive the cameras snapshots
+        scheduler.add_service(Ftp().run)
+
+    if Config.storage_enabled:
+        # Cameras availability for the storage watchdogs
+        scheduler.add('Prober:', Prober().probe, Prober.INTERVAL)
+        # Recorder processes reaping & restarts backoff
+        scheduler.add('Supervisor:', Supervisor().check, Supervisor.INTERVAL)
+
     for camera_key in Config.cameras.keys():
         if Config.storage_enabled:
             # Start streams saving
             s = Storage(camera_key)
             s.run()
-            tasks.append(s.watchdog)
+            scheduler.add(f'Storage: watchdog: {camera_key}', s.watchdog, Config.min_segment_duration)
 
         if Config.events_enabled and Config().cameras[camera_key]['events']:
             # Events checking & rotation
             e = Events(camera_key)
-            tasks.append(e.check)
+            scheduler.add(f"Events: can't handle {camera_key}", e.check, Events.CHECK_INTERVAL_SEC)
+
+    if Config.storage_enabled or Config.events_enabled:
+        # Deletion of expired folders & disk usage control
+        tasks.append(Retention().run)
+
+    tasks.append(scheduler.run)
 
     with ThreadPoolExecutor(len(tasks)) as executor:
         for task in tasks:
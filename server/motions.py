@@ -0,0 +1,161 @@
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import const
+from _config import Config
+from segments import Segments
+from log import log
+
+
+class Motions:
+    """ Persistent motion index of the camera storage for the archive motion search.
+        Each day folder keeps a binary file of (time, size, score) records, one per valid segment,
+        where score is the segment size relative to the average size of the previous segments.
+        Records are appended as segments are closed. Missing or outdated day files (e.g. the server was stopped)
+        are rebuilt from the Segments index once and then kept in memory.
+    """
+    FILE_NAME = '.motions'
+    AVERAGE_LEN = 10
+
+    _RECORD = struct.Struct('<IIf')  # HHMMSS, size, score
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cam_key: str):
+        self._key = cam_key
+        self._cam_path = f"{Config.storage_path}/{Config.cameras[self._key]['folder']}"
+        self._segments = Segments.get(self._key)
+        self._lock = threading.Lock()
+        self._days = {}  # day folder: (array('q') datetimes, array('f') scores)
+        self._recent = deque(maxlen=self.AVERAGE_LEN)  # sizes of the last closed segments
+        self._last = 0  # datetime of the last added segment
+
+    @staticmethod
+    def get(cam_key: str) -> 'Motions':
+        """ Shared index instance for the camera """
+        with Motions._instances_lock:
+            if cam_key not in Motions._instances:
+                Motions._instances[cam_key] = Motions(cam_key)
+            return Motions._instances[cam_key]
+
+    def add(self, date_time: int, size: int) -> None:
+        """ Closed segment (Segments listener) """
+        with self._lock:
+            if date_time <= self._last:
+                return
+            self._last = date_time
+            score = self._get_score(size, self._recent)
+            day = self._get_day(date_time)
+            try:
+                with open(f'{self._cam_path}/{day}/{self.FILE_NAME}', 'ab') as file:
+                    file.write(self._RECORD.pack(date_time % 1000000, size, score))
+            except OSError as e:
+                log(f"Motions: can't save {self._key} {day} ({repr(e)})", True)
+            if day in self._days:
+                self._days[day][0].append(date_time)
+                self._days[day][1].append(score)
+
+    def find(self, date_time: int, score: float, forward: bool) -> tuple[str, int]:
+        """ The nearest segment after (or before) "date_time" with the score greater than "score".
+            Returns (full path, size) or ('', 0).
+        """
+        days = self._segments.get_folders()
+        start = self._get_day(date_time)
+        if forward:
+            days = days[bisect_left(days, start):]
+        else:
+            days = reversed(days[:bisect_right(days, start)])
+
+        for day in days:
+            with self._lock:
+                times, scores = self._load(day)
+                if forward:
+                    positions = range(bisect_right(times, date_time), len(times))
+                else:
+                    positions = range(bisect_left(times, date_time) - 1, -1, -1)
+                for i in positions:
+                    if scores[i] <= score:
+                        continue
+                    path, size = self._segments.get_segment(times[i])
+                    if size:  # not deleted by the retention
+                        return path, size
+        return '', 0
+
+    def remove(self, day: str) -> None:
+        """ Forget the day (e.g. deleted by cleanup) """
+        with self._lock:
+            self._days.pop(day, None)
+            try:
+                os.remove(f'{self._cam_path}/{day}/{self.FILE_NAME}')
+            except FileNotFoundError:
+                pass
+
+    def _load(self, day: str) -> tuple[array, array]:
+        """ Day records (called under the lock). The current day is checked each time if there is no Watcher.
+        """
+        if not self._segments.is_ready():  # nothing to compare the day records with yet
+            return array('q'), array('f')
+        if day in self._days and (self._segments.watched or day != self._segments.get_folders()[-1]):
+            return self._days[day]
+
+        segments = [s for s in self._segments.get_items(day) if s[1] >= const.MIN_FILE_SIZE]
+        times, scores = self._read(day)
+        if len(times) != len(segments):
+            times, scores = self._rebuild(day, segments)
+        self._days[day] = (times, scores)
+        return times, scores
+
+    def _read(self, day: str) -> tuple[array, array]:
+        times, scores = array('q'), array('f')
+        try:
+            with open(f'{self._cam_path}/{day}/{self.FILE_NAME}', 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return times, scores
+
+        prefix = int(day.replace('-', '')) * 1000000
+        for hms, _size, score in self._RECORD.iter_unpack(data[:len(data) - len(data) % self._RECORD.size]):
+            times.append(prefix + hms)
+            scores.append(score)
+        return times, scores
+
+    def _rebuild(self, day: str, segments: list[tuple[int, int]]) -> tuple[array, array]:
+        recent = deque(maxlen=self.AVERAGE_LEN)
+        days = self._segments.get_folders()
+        i = bisect_left(days, day)
+        if i > 0:  # the average is continued from the previous day
+            recent.extend(s for _dt, s in self._segments.get_items(days[i - 1]) if s >= const.MIN_FILE_SIZE)
+
+        times, scores = array('q'), array('f')
+        data = bytearray()
+        for date_time, size in segments:
+            score = self._get_score(size, recent)
+            times.append(date_time)
+            scores.append(score)
+            data += self._RECORD.pack(date_time % 1000000, size, score)
+
+        path = f'{self._cam_path}/{day}/{self.FILE_NAME}'
+        try:
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(data)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            log(f"Motions: can't save {self._key} {day} ({repr(e)})", True)
+        return times, scores
+
+    @staticmethod
+    def _get_score(size: int, recent: deque) -> float:
+        """ Size relative to the average of the recent sizes, 0 if unknown. Adds the size to the recent ones.
+        """
+        score = size * len(recent) / sum(recent) if recent else 0.0
+        recent.append(size)
+        return score
+
+    @staticmethod
+    def _get_day(date_time: int) -> str:
+        dt = str(date_time)
+        return f'{dt[0:4]}-{dt[4:6]}-{dt[6:8]}'
@@ -0,0 +1,71 @@
+import asyncio
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from _config import Config
+from log import log
+
+
+class Prober:
+    """ Camera liveness prober (no processes): TCP connection to the camera host:port from its URL.
+        All cameras are probed concurrently in the background, the watchdogs read the cached states.
+    """
+    TIMEOUT = 1.0  # secs
+    INTERVAL = 5  # secs
+    MAX_AGE = 15  # secs, cached state lifetime
+    DEFAULT_PORTS = {'rtsp': 554, 'rtsps': 322, 'rtmp': 1935, 'http': 80, 'https': 443}
+
+    _states = {}  # camera key: (online, monotonic time)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_address(cam_key: str) -> tuple[str, int]:
+        """ (host, port) of the camera, supports host names and IPv6 addresses """
+        url = urlsplit(Config.cameras[cam_key]['url'])
+        try:
+            port = url.port
+        except ValueError:
+            port = None
+        return url.hostname or '', port or Prober.DEFAULT_PORTS.get(url.scheme, 554)
+
+    @staticmethod
+    def is_online(cam_key: str) -> bool:
+        """ Cached state. If it's outdated (the prober isn't running), the camera is probed synchronously.
+        """
+        with Prober._lock:
+            state = Prober._states.get(cam_key)
+        if state and time.monotonic() - state[1] < Prober.MAX_AGE:
+            return state[0]
+
+        try:
+            socket.create_connection(Prober.get_address(cam_key), Prober.TIMEOUT).close()
+            online = True
+        except OSError:
+            online = False
+        Prober._set(cam_key, online)
+        return online
+
+    async def probe(self) -> None:
+        """ Probe all cameras concurrently, called by the scheduler every INTERVAL secs
+        """
+        await asyncio.gather(*(self._probe(key) for key in Config.cameras))
+
+    async def _probe(self, cam_key: str) -> None:
+        try:
+            _reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*Prober.get_address(cam_key)), self.TIMEOUT)
+            writer.close()
+            online = True
+        except (OSError, asyncio.TimeoutError):
+            online = False
+        Prober._set(cam_key, online)
+
+    @staticmethod
+    def _set(cam_key: str, online: bool) -> None:
+        with Prober._lock:
+            state = Prober._states.get(cam_key)
+            Prober._states[cam_key] = (online, time.monotonic())
+        if state and state[0] != online:
+            log(f"Prober: {cam_key} is {'online' if online else 'OFFLINE'}")
@@ -1,43 +1,60 @@
+import os
 import re
 import gettext
 from os import path as os_path
 
+import const
 from _config import Config
-from response import Response
 from share import Share
 
+LOCALE_PATH = f'{os_path.dirname(os_path.realpath(__file__))}/../locale'
+
 
 class Render:
+    _translations = {}  # translation language: translation
+    _cache = {}  # (page, translation language): (html, {file path: mtime})
+
     def __init__(self, language: str):
         self._language = language
 
-        self._i18n = gettext.translation(
-            'base',
-            f'{os_path.dirname(os_path.realpath(__file__))}/../locale',
-            fallback=True,
-            languages=[self._language])
+        # Any unknown language shares the fallback translation (keeps the caches small)
+        self._i18n_language = language if gettext.find('base', LOCALE_PATH, [language]) else ''
+        if self._i18n_language not in Render._translations:
+            Render._translations[self._i18n_language] = gettext.translation(
+                'base',
+                LOCALE_PATH,
+                fallback=True,
+                languages=[self._i18n_language])
+        self._i18n = Render._translations[self._i18n_language]
 
         self.app_title = self._i18n.gettext('Cams')
+        self._mtimes = {}
 
     async def get_html(self, page: str, uri: str, network: str) -> str:
         """ Factory method to read and render a given template (page) in the global layout (/client/layout.html).
             The template should be named "{page}.html" and the rendering method should be named "_render_{page}".
             Returns the finished HTML layout.
         """
-        method_name = f'_render_{page}'
-
         if not re.match(r'^[a-z_]+$', page):
             raise RuntimeError('Render: invalid page', 404)
 
-        layout = await _read_file('layout.html')
-        template = await _read_file(f'{page}.html')
-        template = await self._replace_functions(template)
+        cache_key = (page, self._i18n_language)
+        if cache_key not in Render._cache or not self._is_actual(Render._cache[cache_key][1]):
+            Render._cache[cache_key] = (self._compile(page), self._mtimes)
+
+        # Only per-request placeholders are left in the compiled HTML
+        html = Render._cache[cache_key][0]
+        return html.replace('{uri}', uri).replace('{lang}', self._language).replace('{network}', network)
+
+    def _compile(self, page: str) -> str:
+        method_name = f'_render_{page}'
 
-        html = layout.replace('{content}', template).replace('{uri}', uri)
-        context = {
-            'title': self.app_title, 'lang': self._language, 'start_dt': Share.start_datetime, 'network': network}
+        layout = self._read_file('layout.html')
+        template = self._read_file(f'{page}.html')
+        template = self._replace_functions(template)
 
-        # TODO: cache compiled HTML
+        html = layout.replace('{content}', template)
+        context = {'title': self.app_title, 'start_dt': Share.start_datetime}
 
         if method_name in dir(self):
             render = getattr(self, method_name)
@@ -48,6 +65,14 @@ class Render:
 
         return html
 
+    @staticmethod
+    def _is_actual(mtimes: dict[str, float]) -> bool:
+        """ Templates are not changed since compilation (development mode) """
+        try:
+            return all(os.stat(path).st_mtime == mtime for path, mtime in mtimes.items())
+        except FileNotFoundError:
+            return False
+
     @staticmethod
     def _render_cam() -> dict[str, str]:
         return {
@@ -64,7 +89,7 @@ class Render:
             'title': self._i18n.gettext('Group')
         }
 
-    async def _replace_functions(self, html: str) -> str:
+    def _replace_functions(self, html: str) -> str:
         match = re.findall(r'{([a-z_]+)\((.+?)\)}', html)
         if not match:
             return html  # Nothing to render
@@ -73,20 +98,22 @@ class Render:
             function = pair[0]
             args = pair[1]
             if function == 'include':
-                html = await self._replace_include(html, args)
+                html = self._replace_include(html, args)
             elif function == '_':
                 html = html.replace('{_(' + args + ')}', self._i18n.gettext(args))
 
         return html
 
-    @staticmethod
-    async def _replace_include(html: str, file_name: str) -> str:
+    def _replace_include(self, html: str, file_name: str) -> str:
         if not re.search(r'^[a-z_\-]+\.[a-z]+$', file_name):
             raise RuntimeError('Render: invalid included template')
-        return html.replace('{include(' + file_name + ')}', (await _read_file(file_name)))
-
-
-async def _read_file(file_name: str):
-    return (
-        await Response.read_file(f'{os_path.dirname(os_path.realpath(__file__))}/../client/{file_name}')
-    ).decode()
+        return html.replace('{include(' + file_name + ')}', self._read_file(file_name))
+
+    def _read_file(self, file_name: str) -> str:
+        path = f'{const.CLIENT_PATH}/{file_name}'
+        try:
+            with open(path, encoding='UTF-8') as file:
+                self._mtimes[path] = os.fstat(file.fileno()).st_mtime
+                return file.read()
+        except FileNotFoundError:
+            raise RuntimeError('Render: template not found', 404)
@@ -5,8 +5,12 @@ from urllib.parse import urlparse, parse_qs, unquote
 
 from _config import Config
 from web import Web
+from hub import Hub
 from log import log
 
+MAX_HEAD_SIZE = 16384  # bytes, start line & headers
+MAX_BODY_SIZE = 1048576  # bytes
+
 
 def listen_http() -> None:
     if Config.ssl_certificate and Config.ssl_private_key:
@@ -22,13 +26,41 @@ def listen_http() -> None:
 
 
 async def _main(ctx) -> None:
-    server = await asyncio.start_server(_handle, Config.web_server_host, Config.web_server_port, ssl=ctx)
+    Hub.loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(
+        _handle, Config.web_server_host, Config.web_server_port, ssl=ctx, limit=MAX_HEAD_SIZE)
     async with server:
         await server.serve_forever()
 
 
 async def _handle(reader: asyncio.streams.StreamReader, writer: asyncio.streams.StreamWriter) -> None:
-    raw_request = await _get_request(reader)
+    """ Persistent (keep-alive) connection: handle requests one by one until the client
+        or the server decides to close it. Pipelined requests just wait in the reader buffer.
+    """
+    try:
+        for cnt in range(1, Web.KEEP_ALIVE_MAX + 1):
+            try:
+                raw_request = await _get_request(reader)
+            except asyncio.LimitOverrunError:
+                msg = f'{writer.get_extra_info("peername")[0]} > ""'
+                await Web.send_error(writer, 431, msg, 'Request: header fields too large')
+                break
+            if not raw_request:
+                break  # connection closed by client or idle timeout
+            if not await _handle_request(raw_request, reader, writer, cnt < Web.KEEP_ALIVE_MAX):
+                break
+    except Exception as e:
+        log(f'Request: {repr(e)}', True)
+    finally:
+        writer.close()
+
+
+async def _handle_request(
+        raw_request: str,
+        reader: asyncio.streams.StreamReader,
+        writer: asyncio.streams.StreamWriter,
+        can_keep_alive: bool) -> bool:
+    """ Returns True if the connection can be used for the next request """
     start_line = raw_request.split('\n', 1)[0].strip()
     host = ''
     peer_name = writer.get_extra_info('peername')
@@ -37,14 +69,17 @@ async def _handle(reader: asyncio.streams.StreamReader, writer: asyncio.streams.
         request = await _parse_request(raw_request, peer_name[0])
         host = request['headers']['host']
         peer_name = request['headers']['x-real-ip']
+        request['body'] = await _get_body(reader, request['headers'])
 
         web = Web(writer, request, start_line)
+        web.keep_alive = can_keep_alive and _is_keep_alive(request)
         if request['method'] == 'POST':
             await web.do_post()
         else:
             await web.do_get()
 
         await web.send()
+        return web.keep_alive
 
     except Exception as e:
         error, code = e.args[0], e.args[1] if len(e.args) > 1 and isinstance(e.args[1], int) else 400
@@ -53,23 +88,72 @@ async def _handle(reader: asyncio.streams.StreamReader, writer: asyncio.streams.
             await Web.send_error(writer, code, msg, error)
         except Exception as ex:
             log(f'Request {msg} cancelled ({repr(ex)})', True)
+        return False
 
 
 async def _get_request(reader: asyncio.streams.StreamReader) -> str:
+    """ Read the request head (start line & headers), no more than MAX_HEAD_SIZE bytes.
+        Raises LimitOverrunError if the head is too large.
+    """
     request = ''
     try:
-        request = (await reader.read(1000000000)).decode().strip()
+        head = await asyncio.wait_for(_read_head(reader), Web.KEEP_ALIVE_TIMEOUT)
+        request = head.decode().strip()
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        pass  # client has gone or is idle for too long
+    except asyncio.LimitOverrunError:
+        raise
     except Exception as e:
         log(f'Request: {repr(e)}', True)
     return request
 
 
+async def _read_head(reader: asyncio.streams.StreamReader) -> bytes:
+    """ Lines up to the empty one, either CRLF or bare LF terminated (empty lines before the request are skipped)
+    """
+    head = b''
+    while True:
+        line = await reader.readuntil(b'\n')  # LimitOverrunError if the line is longer than MAX_HEAD_SIZE
+        if not line.strip():
+            if head:
+                return head
+            continue
+        head += line
+        if len(head) > MAX_HEAD_SIZE:
+            raise asyncio.LimitOverrunError('Request: head is too large', len(head))
+
+
+async def _get_body(reader: asyncio.streams.StreamReader, headers: dict) -> bytes:
+    """ Read exactly "Content-Length" bytes of the body (raw, not decoded) """
+    if 'transfer-encoding' in headers:
+        raise Exception('Request: chunked body is not supported', 501)
+
+    length = headers.get('content-length', '0')
+    if not length.isdigit():
+        raise Exception('Request: invalid content length')
+    if int(length) > MAX_BODY_SIZE:
+        raise Exception('Request: body too large', 413)
+    if not int(length):
+        return b''
+
+    try:
+        return await asyncio.wait_for(reader.readexactly(int(length)), Web.KEEP_ALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+        raise Exception('Request: incomplete body')
+
+
+def _is_keep_alive(request: dict) -> bool:
+    connection = request['headers'].get('connection', '').lower()
+    if request['version'] == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
 async def _parse_request(raw_request: str, peer_name: str) -> dict:
     if not raw_request:
         raise Exception('Request: empty request')
 
-    request_parts = re.split(r'(?:\r?\n){2,}', raw_request, 2)
-    header_lines = request_parts[0].splitlines()
+    header_lines = raw_request.splitlines()
     start_line = header_lines[0].split()
     if len(start_line) < 3:
         raise Exception('Request: invalid start line')
@@ -80,7 +164,7 @@ async def _parse_request(raw_request: str, peer_name: str) -> dict:
         'version': start_line[2],
         'headers': {},
         'query': parse_qs(urlparse(start_line[1]).query),  # GET params (dict)
-        'body': ''
+        'body': b''
     }
     if not request['version'].startswith('HTTP/'):
         raise Exception('Request: invalid version')
@@ -107,8 +191,6 @@ async def _parse_request(raw_request: str, peer_name: str) -> dict:
 
     request['headers']['x-language'] = _get_lang(request['headers'])
 
-    request['body'] = request_parts[1] if len(request_parts) > 1 else ''
-
     request['headers']['x-user-agent'] = normalize_ua(request['headers']['user-agent'])
 
     return request
@@ -5,36 +5,64 @@ from log import log
 
 
 class Response:
+    KEEP_ALIVE_TIMEOUT = 15  # secs
+    KEEP_ALIVE_MAX = 100  # max requests per connection
+    CODES = {
+        200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+        413: 'Content Too Large', 431: 'Request Header Fields Too Large', 501: 'Not Implemented'}
+
     def __init__(self, writer: asyncio.streams.StreamWriter, request: dict, start_line: str):
         self._writer = writer
         self.request = request
         self.start_line = start_line
+        self.code = 200
         self.headers = []
         self.body = b''
+        self.file_path = ''  # streamed from disk after headers, instead of body
+        self.file_size = 0
+        self.fallback_file = ('', 0)  # (path, size) streamed if file_path is gone (e.g. evicted from a cache)
         self.handle_sse = None
         self.close_sse_connection = False
+        self.sse_queue = None
+        self.keep_alive = False
 
     @staticmethod
     async def send_error(writer:  asyncio.streams.StreamWriter, code: int, msg: str, error: str) -> None:
-        codes = {400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found'}
-        if code not in codes:
+        if code not in Response.CODES or code < 400:
             code = 400
 
-        headers = [f'HTTP/1.1 {code} {codes[code]}', '', '',]
+        headers = [f'HTTP/1.1 {code} {Response.CODES[code]}', 'Content-Length: 0', 'Connection: close', '', '']
         writer.write(('\r\n'.join(headers)).encode('UTF-8'))
         await writer.drain()
         writer.close()
         log(f'Request {msg} {code}: {error}', True)
 
     async def send(self) -> None:
-        headers = ['HTTP/1.1 200 OK']
+        headers = [f'HTTP/1.1 {self.code} {self.CODES[self.code]}']
+        file = self._open_file() if self.file_path else None  # open before headers are sent (may raise "not found")
 
         peer = self.request['headers']['x-real-ip']
         host = self.request['headers']['x-host']
         ua = self.request['headers']['x-user-agent']
-        msg = f'Request {peer} ({ua}) > {host} "{unquote(self.start_line)}" 200'
+        msg = f'Request {peer} ({ua}) > {host} "{unquote(self.start_line)}" {self.code}'
+
+        if self.handle_sse:
+            self.keep_alive = False
+        elif self.code != 304:  # no body
+            headers.append(f'Content-Length: {self.file_size if self.file_path else len(self.body)}')
+
+        if self.keep_alive:
+            headers += ['Connection: keep-alive', f'Keep-Alive: timeout={self.KEEP_ALIVE_TIMEOUT}']
+        else:
+            headers.append('Connection: close')
 
-        if not self.handle_sse:
+        if self.file_path:
+            headers = ('\r\n'.join(headers + self.headers)).encode('UTF-8')
+            with file:
+                await self.write(headers + b'\r\n\r\n')
+                await self._send_file(file)
+            log(msg)
+        elif not self.handle_sse:
             headers = ('\r\n'.join(headers + self.headers)).encode('UTF-8')
             await self.write(headers + b'\r\n\r\n' + self.body)
             log(msg)
@@ -52,20 +80,27 @@ class Response:
 
             log(f'SSE closed: {res}')
 
-        self._writer.close()
-
     async def write(self, content: bytes) -> None:
         self._writer.write(content)
         await self._writer.drain()
 
+    def _open_file(self):
+        try:
+            return open(self.file_path, 'rb')
+        except FileNotFoundError:
+            if not self.fallback_file[0]:
+                raise
+            self.file_path, self.file_size = self.fallback_file
+            return open(self.file_path, 'rb')
+
+    async def _send_file(self, file) -> None:
+        """ Zero-copy file streaming (os.sendfile) for plain sockets.
+            Transports without sendfile support (TLS) fall back to chunked reads in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        sent = await loop.sendfile(self._writer.transport, file, 0, self.file_size or None, fallback=True)
+        if sent < self.file_size:
+            self.keep_alive = False  # the file was truncated, Content-Length is broken
+
     def close(self) -> None:
         self._writer.close()
-
-    @staticmethod
-    async def read_file(filename: str) -> bytes:
-        p = await asyncio.create_subprocess_shell(
-            f'cat {filename}',
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, _stderr = await p.communicate()
-        return stdout
@@ -0,0 +1,150 @@
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import const
+import fs
+from _config import Config
+from segments import Segments
+from motions import Motions
+from log import log
+
+
+class Retention:
+    """ Storage retention engine.
+        Deletes scheduled folders (expired days of video and events) in small batches with pauses,
+        so the storage commands are not stalled by the disk I/O.
+        Also keeps the storage disk usage under "storage_max_usage" by evicting the oldest minutes of all cameras,
+        and the total size of the cameras segments under "storage_quota_gb" shared by the cameras "weight".
+    """
+    BATCH_SIZE = 100  # files deleted at once
+    BATCH_PAUSE = 0.5  # secs between batches (I/O throttling)
+    CHECK_INTERVAL = 60  # secs, disk usage check
+    PROTECTED_MINUTES = 60  # the recent archive is never evicted
+
+    _queue = deque()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def delete(path: str) -> None:
+        """ Schedule the folder deletion (thread safe) """
+        with Retention._lock:
+            if path not in Retention._queue:
+                Retention._queue.append(path)
+
+    def run(self) -> None:
+        """ Infinite loop for deletion
+        """
+        log('* Retention: start')
+        last_check = 0.0
+        while True:
+            try:
+                path = self._pop()
+                if path:
+                    self._delete_tree(path)
+                    continue
+                if time.monotonic() - last_check >= self.CHECK_INTERVAL and self._is_indexed():
+                    last_check = time.monotonic()
+                    self._check_quota()
+                    self._check_usage()
+                time.sleep(1)
+            except Exception as e:
+                log(f'Retention: {repr(e)}', True)
+                time.sleep(1)
+
+    @staticmethod
+    def _pop() -> str:
+        with Retention._lock:
+            return Retention._queue.popleft() if Retention._queue else ''
+
+    def _delete_tree(self, path: str) -> None:
+        cnt = 0
+        for root, _dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                try:
+                    os.remove(f'{root}/{name}')
+                except FileNotFoundError:
+                    pass
+                cnt += 1
+                if cnt % self.BATCH_SIZE == 0:
+                    time.sleep(self.BATCH_PAUSE)
+            fs.remove_dir_if_empty(root)
+
+    def _check_usage(self) -> None:
+        max_usage = getattr(Config, 'storage_max_usage', 0)
+        if not max_usage:
+            return
+
+        protected_folder = (datetime.now() - timedelta(minutes=self.PROTECTED_MINUTES)).strftime(const.DT_PATH_FORMAT)
+        while self._get_usage() > max_usage:
+            key, folder = self._get_oldest_folder()
+            if not folder or folder >= protected_folder:
+                log(f'Retention: disk usage is over {max_usage}%, nothing to evict', True)
+                return
+
+            self._evict(key, folder)
+
+    def _check_quota(self) -> None:
+        """ The storage budget is shared by cameras in proportion to their weights.
+            While the budget is exceeded, the oldest minute of the camera with the largest quota overrun is evicted.
+            Sizes are taken from the running tallies of the Segments index.
+        """
+        budget = getattr(Config, 'storage_quota_gb', 0) * 1073741824
+        if not budget:
+            return
+
+        weights = {key: float(cam.get('weight', 1)) for key, cam in Config.cameras.items()}
+        total_weight = sum(weights.values()) or 1
+        quotas = {key: budget * weight / total_weight for key, weight in weights.items() if weight > 0}
+
+        protected_folder = (datetime.now() - timedelta(minutes=self.PROTECTED_MINUTES)).strftime(const.DT_PATH_FORMAT)
+        protected_keys = set()
+        while sum(Segments.get(key).get_total_size() for key in quotas) > budget:
+            overruns = {
+                key: Segments.get(key).get_total_size() / quota
+                for key, quota in quotas.items() if key not in protected_keys}
+            if not overruns:
+                log('Retention: storage quota is exceeded, nothing to evict', True)
+                return
+
+            key = max(overruns, key=overruns.get)
+            folder = Segments.get(key).get_first_folder()
+            if not folder or folder >= protected_folder:
+                protected_keys.add(key)
+                continue
+            self._evict(key, folder)
+
+    def _evict(self, key: str, folder: str) -> None:
+        """ Delete the camera minute folder """
+        Segments.get(key).remove(folder)
+        cam_path = f"{Config.storage_path}/{Config.cameras[key]['folder']}"
+        self._delete_tree(f'{cam_path}/{folder}')
+        parts = folder.split('/')
+        if fs.remove_dir_if_empty(f'{cam_path}/{parts[0]}/{parts[1]}') and not fs.list_dir(f'{cam_path}/{parts[0]}'):
+            Motions.get(key).remove(parts[0])
+            fs.remove_dir_if_empty(f'{cam_path}/{parts[0]}')
+        log(f'Retention: evict {key} {folder}')
+
+    @staticmethod
+    def _is_indexed() -> bool:
+        """ The sizes and the oldest folders are known only after the initial scans of the Segments indexes """
+        return all(Segments.get(key).is_ready() for key in Config.cameras)
+
+    @staticmethod
+    def _get_usage() -> float:
+        """ Storage disk usage, % """
+        usage = shutil.disk_usage(Config.storage_path)
+        return usage.used * 100 / usage.total
+
+    @staticmethod
+    def _get_oldest_folder() -> tuple[str, str]:
+        """ The oldest minute folder of all the cameras as (camera key, folder) """
+        oldest = ('', '')
+        for key in Config.cameras:
+            folder = Segments.get(key).get_first_folder()
+            if folder and (not oldest[1] or folder < oldest[1]):
+                oldest = (key, folder)
+        return oldest
@@ -0,0 +1,49 @@
+import asyncio
+import random
+
+from log import log
+
+
+class Scheduler:
+    """ Periodic jobs of all cameras (watchdogs, events checks, probing...) in one asyncio loop and one thread.
+        The first runs are spread over the interval and every next delay is jittered,
+        so the jobs of many cameras don't fire simultaneously.
+        Jobs must be short: a blocking job delays all the others, slow filesystem work goes to fs.run_async
+        or to the Retention thread.
+    """
+    JITTER = 0.1  # share of the interval
+
+    def __init__(self):
+        self._jobs = []  # [(name, function, interval)]
+        self._services = []  # [coroutine function]
+
+    def add(self, name: str, func, interval: float) -> None:
+        """ Run "func" (plain or coroutine function) every "interval" secs. "name" prefixes the error messages.
+        """
+        self._jobs.append((name, func, interval))
+
+    def add_service(self, func) -> None:
+        """ Run long-living coroutine function "func" in the loop """
+        self._services.append(func)
+
+    def run(self) -> None:
+        """ Infinite loop for all jobs
+        """
+        log(f'* Scheduler: start {len(self._jobs)} jobs')
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        tasks = [asyncio.create_task(func()) for func in self._services]
+        tasks += [asyncio.create_task(self._loop(*job)) for job in self._jobs]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _loop(self, name: str, func, interval: float) -> None:
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            try:
+                result = func()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                log(f'{name} ({repr(e)})', True)
+            await asyncio.sleep(interval * random.uniform(1 - self.JITTER, 1 + self.JITTER))
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+import const
+from _config import Config
+from log import log
+
+
+class Segments:
+    """ In-memory index of the camera storage.
+        Segments are stored as sorted datetimes (DT_WEB_FORMAT digits as int) with parallel sizes in compact arrays,
+        so any folder of the "%Y-%m-%d/%H/%M" tree is a contiguous slice found by binary search,
+        as well as the nearest segments of any moment.
+        The index is built once at startup with os.scandir in a worker thread (requests never wait for the scan,
+        till then they see only the segments added since the start) and updated incrementally
+        (new segments are just appended).
+        Closed segments are pushed by Watcher, which wakes all the clients waiting for the live segment at once.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+    MAX_CLOSE_INTERVAL = 60.0  # secs, longer intervals are gaps (e.g. restarts), not segment durations
+    CLOSE_INTERVAL_WEIGHT = 0.2  # smoothing of the interval between closed segments
+
+    # Number of datetime digits below each folder level: root, day, hour, minute
+    _LEVEL_DIGITS = (14, 6, 4, 2)
+
+    def __init__(self, cam_key: str):
+        self._key = cam_key
+        self._cam_path = f"{Config.storage_path}/{Config.cameras[self._key]['folder']}"
+        self._lock = threading.Lock()
+        self.watched = False  # True if Watcher watches the live folders of the camera
+        self._ready = threading.Event()
+        self._removed = []  # folders removed while the index is being built
+        self._times = array('q')
+        self._sizes = array('q')
+        self._total_size = 0  # running tally of the sizes
+        self._last_closed = (0, 0, 0.0)  # datetime, size, monotonic time
+        self._close_interval = 0.0  # secs, smoothed interval between closed segments, 0 if unknown
+        self._waiters = []  # [(loop, future)]
+        self._listeners = []  # [callback(datetime, size)] of closed segments
+
+    @staticmethod
+    def get(cam_key: str) -> 'Segments':
+        """ Shared index instance for the camera """
+        with Segments._instances_lock:
+            if cam_key not in Segments._instances:
+                Segments._instances[cam_key] = Segments(cam_key)
+            return Segments._instances[cam_key]
+
+    def get_files(self, folder: str) -> list[tuple[int, str]]:
+        """ Files of the minute folder as [(size, name)] """
+        with self._lock:
+            lo, hi = self._get_slice(folder)
+            return [(self._sizes[i], f'{self._times[i] % 100:02d}.mp4') for i in range(lo, hi)]
+
+    def get_files_by_folders(self, folders: list[str]) -> list[tuple[int, str]]:
+        """ Files of the minute folders as [(size, full path)] """
+        out = []
+        with self._lock:
+            for folder in folders:
+                lo, hi = self._get_slice(folder)
+                out += [(self._sizes[i], self._get_path(self._times[i])) for i in range(lo, hi)]
+        return out
+
+    def get_items(self, folder: str) -> list[tuple[int, int]]:
+        """ Segments of the folder (any level) as [(datetime, size)] """
+        with self._lock:
+            lo, hi = self._get_slice(folder)
+            return list(zip(self._times[lo:hi], self._sizes[lo:hi]))
+
+    def get_segment(self, date_time: int) -> tuple[str, int]:
+        """ (full path, size) of the segment, ('', 0) if it doesn't exist """
+        with self._lock:
+            i = bisect_left(self._times, date_time)
+            if i < len(self._times) and self._times[i] == date_time:
+                return self._get_path(date_time), self._sizes[i]
+        return '', 0
+
+    def get_next(self, date_time: int, step: int) -> tuple[str, int]:
+        """ (full path, size) of the step-th valid segment after (step > 0) or before (step < 0) "date_time",
+            ('', 0) if there is no such segment
+        """
+        with self._lock:
+            if step > 0:
+                positions = range(bisect_right(self._times, date_time), len(self._times))
+            else:
+                positions = range(bisect_left(self._times, date_time) - 1, -1, -1)
+            cnt = 0
+            for i in positions:
+                if self._sizes[i] < const.MIN_FILE_SIZE:
+                    continue  # broken segment
+                cnt += 1
+                if cnt == abs(step):
+                    return self._get_path(self._times[i]), self._sizes[i]
+        return '', 0
+
+    def get_total_size(self) -> int:
+        """ Size of all the camera segments, bytes """
+        with self._lock:
+            return self._total_size
+
+    def get_first_folder(self) -> str:
+        """ The oldest minute folder, empty string if there are no segments """
+        with self._lock:
+            if not self._times:
+                return ''
+            return '/'.join(self._get_path(self._times[0])[len(self._cam_path) + 1:].split('/')[0:-1])
+
+    def get_folders(self, parent: str = '') -> list[str]:
+        """ Sorted non-empty child folders of the parent folder ('' is the camera root) """
+        parts = parent.split('/') if parent else []
+        if len(parts) >= len(self._LEVEL_DIGITS) - 1:
+            return []
+        child_digits = self._LEVEL_DIGITS[len(parts) + 1]
+        out = []
+        with self._lock:
+            i, hi = self._get_slice(parent)
+            while i < hi:
+                prefix = self._times[i] // 10 ** child_digits
+                out.append(self._get_folder_name(prefix, len(parts)))
+                i = bisect_left(self._times, (prefix + 1) * 10 ** child_digits, i, hi)
+        return out
+
+    def scan(self, folder: str) -> None:
+        """ Re-read the minute folder from disk and replace its entries """
+        files = sorted(self._scan_files(folder))
+
+        with self._lock:
+            lo, hi = self._get_slice(folder)
+            self._total_size += sum(f[1] for f in files) - sum(self._sizes[lo:hi])
+            self._times[lo:hi] = array('q', (f[0] for f in files))
+            self._sizes[lo:hi] = array('q', (f[1] for f in files))
+
+    def add(self, path: str, size: int) -> None:
+        """ Add or update one segment by its full path """
+        date_time = self.get_datetime(path[len(self._cam_path) + 1:])
+        with self._lock:
+            self._total_size += size
+            if not self._times or date_time > self._times[-1]:  # regular case: the next segment
+                self._times.append(date_time)
+                self._sizes.append(size)
+                return
+            i = bisect_left(self._times, date_time)
+            if self._times[i] == date_time:
+                self._total_size -= self._sizes[i]
+                self._sizes[i] = size
+                return
+            self._times.insert(i, date_time)
+            self._sizes.insert(i, size)
+
+    def close(self, path: str, size: int) -> None:
+        """ The segment is finished by the storage command (called by Watcher in the scheduler loop) """
+        self.add(path, size)
+        if size < const.MIN_FILE_SIZE:
+            return  # broken segment
+        date_time = self.get_datetime(path[len(self._cam_path) + 1:])
+        with self._lock:
+            if date_time < self._last_closed[0]:
+                return
+            now = time.monotonic()
+            interval = now - self._last_closed[2]
+            if interval < self.MAX_CLOSE_INTERVAL:  # skip recorder restarts
+                self._close_interval = interval if not self._close_interval else (
+                    self._close_interval * (1 - self.CLOSE_INTERVAL_WEIGHT) + interval * self.CLOSE_INTERVAL_WEIGHT)
+            self._last_closed = (date_time, size, now)
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._wake, future, (path, size))
+        for callback in self._listeners:
+            callback(date_time, size)
+
+    def add_listener(self, callback) -> None:
+        """ Call "callback(datetime, size)" for each closed segment (in the scheduler loop, must be short) """
+        self._listeners.append(callback)
+
+    def get_closed_age(self) -> float:
+        """ Secs since the last segment was closed, infinity if nothing is closed yet """
+        with self._lock:
+            closed_at = self._last_closed[2]
+        return time.monotonic() - closed_at if closed_at else float('inf')
+
+    def get_close_interval(self) -> float:
+        """ Usual interval between closed segments (secs), i.e. the segment duration, 0 if unknown """
+        with self._lock:
+            return self._close_interval
+
+    def get_live(self, max_age: float) -> tuple[str, int]:
+        """ The last closed segment (path, size) if it was closed not earlier than "max_age" secs ago """
+        with self._lock:
+            date_time, size, closed_at = self._last_closed
+        if not size or time.monotonic() - closed_at > max_age:
+            return '', 0
+        return self._get_path(date_time), size
+
+    async def wait_live(self, date_time: int, timeout: float) -> tuple[str, int]:
+        """ Wait for the closed segment newer than "date_time" """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._last_closed[0] > date_time:
+                return self._get_path(self._last_closed[0]), self._last_closed[1]
+            self._waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return '', 0
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    @staticmethod
+    def _wake(future: asyncio.Future, segment: tuple[str, int]) -> None:
+        if not future.done():
+            future.set_result(segment)
+
+    def remove(self, folder: str) -> None:
+        """ Forget the folder (e.g. deleted by cleanup) """
+        with self._lock:
+            if not self._ready.is_set():
+                self._removed.append(folder)
+            lo, hi = self._get_slice(folder)
+            self._total_size -= sum(self._sizes[lo:hi])
+            del self._times[lo:hi]
+            del self._sizes[lo:hi]
+
+    @staticmethod
+    def get_datetime(relative_path: str) -> int:
+        """ "2024-05-18/10/49/33.mp4" -> 20240518104933 """
+        return int(re.sub(r'\D', '', re.sub(r'\.[^.]+$', '', relative_path)))
+
+    def _get_path(self, date_time: int) -> str:
+        dt = str(date_time)
+        return f'{self._cam_path}/{dt[0:4]}-{dt[4:6]}-{dt[6:8]}/{dt[8:10]}/{dt[10:12]}/{dt[12:14]}.mp4'
+
+    def _get_slice(self, folder: str) -> tuple[int, int]:
+        """ Index range [lo, hi) of the folder segments """
+        if not folder:
+            return 0, len(self._times)
+        parts = folder.split('/')
+        digits = self._LEVEL_DIGITS[min(len(parts), len(self._LEVEL_DIGITS) - 1)]
+        prefix = int(re.sub(r'\D', '', folder) or 0)
+        lo = bisect_left(self._times, prefix * 10 ** digits)
+        hi = bisect_left(self._times, (prefix + 1) * 10 ** digits, lo)
+        return lo, hi
+
+    @staticmethod
+    def _get_folder_name(prefix: int, level: int) -> str:
+        if level == 0:  # day
+            dt = f'{prefix:08d}'
+            return f'{dt[0:4]}-{dt[4:6]}-{dt[6:8]}'
+        return f'{prefix % 100:02d}'  # hour or minute
+
+    def build(self) -> None:
+        """ Initial scan of the whole camera storage (called once at startup from a worker thread).
+            Segments added or removed during the scan are merged in.
+        """
+        if self._ready.is_set():
+            return
+
+        files = {}
+        for day in self._scan_dirs(self._cam_path):
+            for hour in self._scan_dirs(f'{self._cam_path}/{day}'):
+                for minute in self._scan_dirs(f'{self._cam_path}/{day}/{hour}'):
+                    files.update(self._scan_files(f'{day}/{hour}/{minute}'))
+
+        with self._lock:
+            files.update(zip(self._times, self._sizes))
+            items = sorted(files.items())
+            self._times = array('q', (f[0] for f in items))
+            self._sizes = array('q', (f[1] for f in items))
+            for folder in self._removed:
+                lo, hi = self._get_slice(folder)
+                del self._times[lo:hi]
+                del self._sizes[lo:hi]
+            self._removed = []
+            self._total_size = sum(self._sizes)
+            cnt = len(self._times)
+            self._ready.set()
+        log(f'Segments: {self._key} index is built ({cnt} segments)')
+
+    def is_ready(self) -> bool:
+        """ True if the initial scan is finished """
+        return self._ready.is_set()
+
+    def _scan_files(self, folder: str) -> list[tuple[int, int]]:
+        """ [(datetime, size)] of the minute folder """
+        files = []
+        try:
+            with os.scandir(f'{self._cam_path}/{folder}') as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.mp4'):
+                        files.append((self.get_datetime(f'{folder}/{entry.name}'), entry.stat().st_size))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return files
+
+    @staticmethod
+    def _scan_dirs(path: str) -> list[str]:
+        try:
+            with os.scandir(path) as it:
+                return [entry.name for entry in it if entry.is_dir() and re.match(r'^[\d-]+$', entry.name)]
+        except FileNotFoundError:
+            return []
@@ -1,9 +1,9 @@
-import subprocess
+import socket
+import struct
 from datetime import datetime
 
 
 class Share:
-    cam_motions = {}
     sse_clients = {}
     start_datetime = datetime.now().strftime('%d%H%M')
     _default_gateway_ip = ''
@@ -13,8 +13,11 @@ class Share:
         if Share._default_gateway_ip:
             return Share._default_gateway_ip
         try:
-            Share._default_gateway_ip = subprocess.run(
-                'ip route | grep default', shell=True, capture_output=True
-            ).stdout.decode().split(' ')[2]
+            with open('/proc/net/route') as file:
+                for line in file.readlines()[1:]:
+                    fields = line.split()  # Iface, Destination, Gateway, ...
+                    if fields[1] == '00000000':  # default route
+                        Share._default_gateway_ip = socket.inet_ntoa(struct.pack('=L', int(fields[2], 16)))
+                        break
         finally:
             return Share._default_gateway_ip
@@ -1,16 +1,21 @@
-import time
-import re
+import asyncio
 from datetime import datetime, timedelta
+from subprocess import Popen, TimeoutExpired
 
 import const
-from execute import execute_async, execute, get_execute, get_returncode
+import fs
 from _config import Config
-from videos import Videos
-from share import Share
+from segments import Segments
+from motions import Motions
+from retention import Retention
+from prober import Prober
+from supervisor import Supervisor
+from detector import Detector
+from hub import Hub, MotionEvent
 from log import log
 
-FREEZE_INTERVAL = 30.0
-KILL_TIMEOUT = 5
+FREEZE_INTERVAL = 30.0  # secs to wait for the first segment after start
+FREEZE_FACTOR = 2  # no segments for this number of the segment durations means freeze
 
 
 class Storage:
@@ -18,9 +23,16 @@ class Storage:
         self._key = camera_key
         self._cam_path = f"{Config.storage_path}/{Config.cameras[self._key]['folder']}"
         self._start_time = None
-        self._main_process = None
         self._last_rotation_date = ''
-        self._videos = Videos(self._key)
+        self._segments = Segments.get(self._key)
+        self._motions = Motions.get(self._key)
+        self._segments.add_listener(self._motions.add)
+        self._detector = None
+        self._last_detected = 0  # datetime of the last segment passed to the motion detector
+        cfg = Config.cameras[self._key]
+        if cfg['sensitivity'] > 1:
+            self._detector = Detector(cfg['sensitivity'], cfg.get('z_score', Detector.Z_SCORE))
+            self._segments.add_listener(self._detect_motion)
 
     def run(self) -> None:
         """ Start fragments saving """
@@ -40,42 +52,32 @@ class Storage:
         else:
             cmd = Config.storage_command
 
-        cam_ip = re.findall(r'\d+(?:\.\d+){3}', cfg['url'])
-        if not cam_ip:
-            log(f"Storage: can't parse cam IP from URL for {self._key}", True)
+        host, port = Prober.get_address(self._key)
+        if not host:
+            log(f"Storage: can't parse cam host from URL for {self._key}", True)
             return
 
         self._start_time = datetime.now()
 
-        ping = get_returncode(f'ping -c 1 -W 1 {cam_ip[0]}')
-        if ping != 0:
-            log(f'Storage: OFFLINE: {self._key} ({cam_ip[0]})')
+        if not Prober.is_online(self._key):
+            Supervisor.fail(self._key)
+            log(f'Storage: OFFLINE: {self._key} ({host}:{port})')
             return
 
         cmd = cmd.replace('{url}', f'"{cfg['url']}"').replace('{cam_path}', f'{self._cam_path}')
 
-        self._main_process = execute_async(cmd)
+        process = Supervisor.start(self._key, cmd)
 
-        log(f'* Storage: {caller}: start saving process {self._main_process.pid} {self._key}')
+        restarts = Supervisor.get_stats(self._key)['restarts']
+        log(f'* Storage: {caller}: start saving process {process.pid} {self._key} (restarts: {restarts})')
 
     def _mkdir(self, folder: str) -> None:
         """ Create storage folder if not exists
         """
-        execute(f'mkdir -p {self._cam_path}/{folder}')
+        fs.make_dirs(f'{self._cam_path}/{folder}')
 
     def watchdog(self) -> None:
-        """ Infinite loop for checking camera(s) availability
-        """
-        log(f'* Storage: watchdog: start {self._key}')
-        while True:
-            time.sleep(Config.min_segment_duration)
-            try:
-                self._watchdog()
-            except Exception as e:
-                log(f'Storage: watchdog: {self._key} ({repr(e)})', True)
-
-    def _watchdog(self) -> None:
-        """ Extremely important piece.
+        """ Extremely important piece, called by the scheduler every "min_segment_duration" secs.
             Checks if saving is frozen and creates next working directory.
             Cameras can turn off on power loss, or external commands can freeze.
         """
@@ -85,33 +87,47 @@ class Storage:
         self._mkdir((datetime.now() + timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT))
         self._cleanup()
 
-        prev_dir = f'{self._cam_path}/{(datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)}'
-        working_dir = f'{self._cam_path}/{datetime.now().strftime(const.DT_PATH_FORMAT)}'
-        ls = get_execute(f'ls -l {prev_dir}/* {working_dir}/* | awk ' + "'{print $5,$9}'").splitlines()
-        if ls:
-            ls = ls[-10:]
-        if ls:
-            self._live_motion_detector(ls[:-1])
-        if ls or not self._start_time or (datetime.now() - self._start_time).total_seconds() < FREEZE_INTERVAL:
+        prev_dir = (datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)
+        working_dir = datetime.now().strftime(const.DT_PATH_FORMAT)
+        if not self._segments.watched:
+            self._segments.scan(prev_dir)
+            self._segments.scan(working_dir)
+        ls = self._segments.get_files_by_folders([prev_dir, working_dir])
+        if self._detector and not self._segments.watched:
+            for size, path in ls[-10:-1]:  # the last one may be unfinished
+                if size > const.MIN_FILE_SIZE:
+                    self._detect_motion(Segments.get_datetime(path[len(self._cam_path) + 1:]), size)
+        running = Supervisor.is_running(self._key)
+        if running and not self._is_frozen(bool(ls)):
             return  # normal case
+        if not Supervisor.can_start(self._key):
+            return  # backoff after failures
 
-        log(f'Storage: FREEZE: {self._key}')
-
-        # Freeze detected, restart
+        # Freeze detected (or the process is dead / camera is offline), restart
         self._start_time = None
 
-        if self._main_process:
-            try:
-                self._main_process.kill()
-                daily_dir = datetime.now().strftime(const.DT_ROOT_FORMAT)
-                self._delete_unfinished(daily_dir)
-                # Wait for the process die to avoid "zombie"
-                # Perhaps the timeout should be greater than DefaultTimeoutStopSec in /etc/systemd/system.conf
-                time.sleep(KILL_TIMEOUT)
-            except Exception as e:
-                log(f"Storage: watchdog: can't kill {self._main_process.pid} {self._key} ({repr(e)})", True)
+        if running:
+            log(f'Storage: FREEZE: {self._key}')
+            Supervisor.fail(self._key)
+            # The process is killed and reaped by the supervisor
+            process = Supervisor.stop(self._key)
+            if self._detector:
+                self._detector.reset()
+            # Restart when the stopped process has exited and its unfinished files are deleted (in the background)
+            loop = asyncio.get_running_loop()
+            future = fs.run_async(self._delete_unfinished, datetime.now().strftime(const.DT_ROOT_FORMAT), process)
+            future.add_done_callback(lambda _f: loop.call_soon_threadsafe(self._restart))
+            return
+
+        self._restart()
 
-        self._start_saving('watchdog')
+    def _restart(self) -> None:
+        try:
+            self._mkdir((datetime.now() + timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT))
+            self._start_saving('watchdog')
+        except Exception as e:
+            log(f"Storage: can't restart saving {self._key} ({repr(e)})", True)
+            return
 
         # Remove previous folders if empty
         prev_min = datetime.now() - timedelta(minutes=1)
@@ -121,41 +137,38 @@ class Storage:
             return
         self._remove_folder_if_empty(prev_min.strftime(const.DT_ROOT_FORMAT))
 
-    def _live_motion_detector(self, file_list) -> None:
-        cfg = Config.cameras[self._key]
-        if cfg['sensitivity'] <= 1 or len(file_list) < 2:
-            return
-        total_size = 0
-        cnt = 0
-        for file in file_list[:-1]:
-            f = file.split(' ')
-            if int(f[0]) <= const.MIN_FILE_SIZE:
-                continue
-            total_size += int(f[0])
-            cnt += 1
-        if not cnt:
+    def _is_frozen(self, has_files: bool) -> bool:
+        """ With Watcher the freeze is detected by the time of the last closed segment (within one segment
+            duration), otherwise by the absence of files in the previous and current minute folders.
+        """
+        elapsed = (datetime.now() - self._start_time).total_seconds()
+        if not self._segments.watched:
+            return not has_files and elapsed >= FREEZE_INTERVAL
+
+        age = self._segments.get_closed_age()
+        if age >= elapsed:  # nothing is closed since the start, the recorder may be connecting yet
+            return elapsed >= FREEZE_INTERVAL
+        interval = self._segments.get_close_interval()
+        return age > (max(Config.min_segment_duration, FREEZE_FACTOR * interval) if interval else FREEZE_INTERVAL)
+
+    def _detect_motion(self, date_time: int, size: int) -> None:
+        """ Closed segment of the camera (from Watcher or the watchdog scan)
+        """
+        if date_time <= self._last_detected:
             return
+        self._last_detected = date_time
 
-        last_file = file_list[-1].split(' ')
-        average_size = total_size / cnt
-
-        if float(last_file[0]) > average_size * cfg['sensitivity']:
-            date_time = self._videos.get_datetime_by_path(last_file[1])
-            if self._key in Share.cam_motions and Share.cam_motions[self._key] >= date_time:
-                return
-            Share.cam_motions[self._key] = date_time
-            mtime = f'{date_time[8:10]}:{date_time[10:12]}:{date_time[12:14]}'
-            log(f'Storage: motion detected: {mtime} {self._key}')
+        score = self._detector.feed(size)
+        if not score:
+            return
+        date_time = str(date_time)
+        if not Hub.publish(MotionEvent(self._key, date_time, 'storage', score)):
+            return
+        mtime = f'{date_time[8:10]}:{date_time[10:12]}:{date_time[12:14]}'
+        log(f'Storage: motion detected: {mtime} {self._key}')
 
     def _remove_folder_if_empty(self, folder) -> bool:
-        path = f'{self._cam_path}/{folder}'
-
-        ls = get_execute(f'ls -A {path}')
-        if ls:
-            return False  # not empty
-
-        execute(f'rmdir {path}')
-        return True
+        return fs.remove_dir_if_empty(f'{self._cam_path}/{folder}')
 
     def _cleanup(self) -> None:
         """ Cleanup (once a day)
@@ -165,27 +178,33 @@ class Storage:
             return
         self._last_rotation_date = now_date
 
-        ls = get_execute(f'ls -d {self._cam_path}/*').splitlines()
+        ls = fs.list_dir(self._cam_path)
         if not ls:
             return
 
         oldest_folder = (datetime.now() - timedelta(days=Config.storage_period_days)).strftime(const.DT_ROOT_FORMAT)
 
         cnt = len(ls)
-        for row in ls[:-1]:
-            wd = row.split('/')[-1]
-            if not wd:
-                break
+        for wd in ls[:-1]:
             if wd < oldest_folder and cnt > Config.storage_period_days:
-                execute_async(f'rm -rf {self._cam_path}/{wd}')
+                Retention.delete(f'{self._cam_path}/{wd}')
+                self._segments.remove(wd)
+                self._motions.remove(wd)
                 cnt -= 1
                 log(f'Storage cleanup: remove {self._key} {wd}')
             else:
-                self._delete_unfinished(wd)
+                fs.run_async(self._delete_unfinished, wd)
 
         log(f'Storage: cleanup done {self._key}')
 
-    def _delete_unfinished(self, wd) -> None:
-        # Remove unfinished (low sized) files & empty folders
-        execute(f'find {self._cam_path}/{wd} -type f -size -{const.MIN_FILE_SIZE}c -delete')
-        execute_async(f'find {self._cam_path}/{wd} -type d -empty -delete')
+    def _delete_unfinished(self, wd: str, process: Popen = None) -> None:
+        """ Remove unfinished (low sized) files & empty folders, called in the fs worker.
+            The stopped recorder "process" is waited for first, so it doesn't write anymore.
+        """
+        if process:
+            try:
+                process.wait(Supervisor.KILL_TIMEOUT + 2 * Supervisor.INTERVAL)  # killed after KILL_TIMEOUT
+            except TimeoutExpired:
+                log(f'Storage: process {process.pid} {self._key} is still running', True)
+        fs.delete_small_files(f'{self._cam_path}/{wd}', const.MIN_FILE_SIZE)
+        fs.delete_empty_dirs(f'{self._cam_path}/{wd}')
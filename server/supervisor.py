@@ -0,0 +1,135 @@
+import signal
+import threading
+import time
+from subprocess import Popen
+
+from execute import execute_async
+from log import log
+
+
+class Supervisor:
+    """ Owner of the recorder (storage command) processes.
+        Stopped processes get SIGTERM, then SIGKILL after KILL_TIMEOUT, and are reaped in the background
+        (no zombies, no blocking waits in the watchdogs).
+        Failed starts and crashes delay the next start of the camera exponentially (BACKOFF_MIN...BACKOFF_MAX).
+    """
+    INTERVAL = 1.0  # secs
+    KILL_TIMEOUT = 5  # secs
+    BACKOFF_MIN = 5  # secs
+    BACKOFF_MAX = 300  # secs
+    STABLE_UPTIME = 120  # secs, the process is considered healthy after that and the backoff is reset
+
+    _processes = {}  # camera key: Popen
+    _stopping = []  # [(Popen, SIGKILL monotonic time)]
+    _stats = {}  # camera key: {"restarts", "failures", "started", "next_start"}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start(cam_key: str, cmd: str) -> Popen:
+        """ Start the recorder of the camera, the running one is stopped first """
+        Supervisor.stop(cam_key)
+        process = execute_async(cmd)
+        with Supervisor._lock:
+            stats = Supervisor._get_stats(cam_key)
+            if stats['started']:
+                stats['restarts'] += 1
+            stats['started'] = time.monotonic()
+            Supervisor._processes[cam_key] = process
+        return process
+
+    @staticmethod
+    def stop(cam_key: str):
+        """ Ask the recorder to exit, don't wait. Returns the stopping process (Popen) or None """
+        with Supervisor._lock:
+            process = Supervisor._processes.pop(cam_key, None)
+            if not process:
+                return None
+            Supervisor._stopping.append((process, time.monotonic() + Supervisor.KILL_TIMEOUT))
+        try:
+            process.send_signal(signal.SIGTERM)
+        except OSError as e:
+            log(f"Supervisor: can't stop {process.pid} {cam_key} ({repr(e)})", True)
+        return process
+
+    @staticmethod
+    def fail(cam_key: str) -> None:
+        """ The camera is offline or the recorder doesn't work, postpone the next start """
+        with Supervisor._lock:
+            stats = Supervisor._get_stats(cam_key)
+            stats['failures'] += 1
+            delay = min(Supervisor.BACKOFF_MAX, Supervisor.BACKOFF_MIN * 2 ** (stats['failures'] - 1))
+            stats['next_start'] = time.monotonic() + delay
+
+    @staticmethod
+    def can_start(cam_key: str) -> bool:
+        with Supervisor._lock:
+            return time.monotonic() >= Supervisor._get_stats(cam_key)['next_start']
+
+    @staticmethod
+    def is_running(cam_key: str) -> bool:
+        with Supervisor._lock:
+            process = Supervisor._processes.get(cam_key)
+        return bool(process) and process.poll() is None
+
+    @staticmethod
+    def get_stats(cam_key: str) -> dict:
+        """ {"pid", "uptime" (secs), "restarts", "failures"} """
+        with Supervisor._lock:
+            stats = Supervisor._get_stats(cam_key)
+            process = Supervisor._processes.get(cam_key)
+            return {
+                'pid': process.pid if process else 0,
+                'uptime': round(time.monotonic() - stats['started']) if process else 0,
+                'restarts': stats['restarts'],
+                'failures': stats['failures'],
+            }
+
+    def check(self) -> None:
+        """ Reap exited processes, called by the scheduler every INTERVAL secs
+        """
+        self._check_running()
+        self._check_stopping()
+
+    @staticmethod
+    def _check_running() -> None:
+        now = time.monotonic()
+        with Supervisor._lock:
+            processes = list(Supervisor._processes.items())
+        for cam_key, process in processes:
+            code = process.poll()  # waitpid(WNOHANG)
+            if code is None:
+                with Supervisor._lock:
+                    stats = Supervisor._get_stats(cam_key)
+                    if stats['failures'] and now - stats['started'] > Supervisor.STABLE_UPTIME:
+                        stats['failures'] = 0
+                continue
+            with Supervisor._lock:
+                if Supervisor._processes.get(cam_key) is process:
+                    del Supervisor._processes[cam_key]
+                uptime = round(now - Supervisor._get_stats(cam_key)['started'])
+            log(f'Supervisor: process {process.pid} {cam_key} exited with code {code} after {uptime}s', True)
+            Supervisor.fail(cam_key)
+
+    @staticmethod
+    def _check_stopping() -> None:
+        now = time.monotonic()
+        with Supervisor._lock:
+            stopping = Supervisor._stopping[:]
+        for item in stopping:
+            process, kill_time = item
+            if process.poll() is None:
+                if now < kill_time:
+                    continue
+                try:
+                    process.kill()  # reaped on the next check
+                except OSError as e:
+                    log(f"Supervisor: can't kill {process.pid} ({repr(e)})", True)
+                continue
+            with Supervisor._lock:
+                Supervisor._stopping.remove(item)
+
+    @staticmethod
+    def _get_stats(cam_key: str) -> dict:
+        if cam_key not in Supervisor._stats:
+            Supervisor._stats[cam_key] = {'restarts': 0, 'failures': 0, 'started': 0.0, 'next_start': 0.0}
+        return Supervisor._stats[cam_key]
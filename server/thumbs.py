@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+from _config import Config
+from log import log
+
+try:
+    from PIL import Image  # optional
+except ImportError:
+    Image = None
+
+
+class Thumbs:
+    """ Downscaled variants of the event images for small screens and fast playback.
+        Variants are created on demand (with Pillow if it's installed, with ffmpeg otherwise)
+        and cached on disk in the hidden folder of events_path.
+        The cache is limited by total size, the least recently used variants are deleted first.
+    """
+    WIDTHS = (320, 640, 1280)  # requested width is rounded up to one of these
+    MAX_SIZE = 268435456  # bytes
+    QUALITY = 80  # JPEG quality (Pillow)
+    FFMPEG_TIMEOUT = 10  # secs
+    MAX_ORIGINALS = 4096  # remembered images the variants of which are not smaller or can't be made
+
+    _items = OrderedDict()  # variant path: size
+    _size = 0
+    _loaded = False
+    _tasks = {}  # variant path: task, concurrent requests of the same variant share one conversion
+    _originals = OrderedDict()  # variant path: None, the original image is served
+
+    @staticmethod
+    def get_width(requested: str) -> int:
+        """ Variant width for the requested one, 0 if the original image fits """
+        width = int(requested) if requested.isdigit() else 0
+        return next((w for w in Thumbs.WIDTHS if w >= width), 0) if width else 0
+
+    @staticmethod
+    async def get(path: str, size: int, width: int) -> tuple[str, int]:
+        """ (path, size) of the image variant not wider than "width", the original image if the variant can't be made
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return path, size
+        folder = f'{Config.events_path}/.thumbs'
+        name = hashlib.sha1(f'{path}:{mtime}:{width}'.encode()).hexdigest()
+        variant_path = f'{folder}/{name}.jpg'
+
+        if not Thumbs._loaded:
+            Thumbs._loaded = True
+            await asyncio.to_thread(Thumbs._load, folder)
+
+        if variant_path in Thumbs._items:
+            if os.path.exists(variant_path):
+                Thumbs._items.move_to_end(variant_path)
+                return variant_path, Thumbs._items[variant_path]
+            Thumbs._size -= Thumbs._items.pop(variant_path)  # deleted outside, make it again
+        if variant_path in Thumbs._originals:
+            return path, size
+
+        task = Thumbs._tasks.get(variant_path)
+        if not task:
+            task = asyncio.ensure_future(Thumbs._make(path, size, variant_path, width))
+            Thumbs._tasks[variant_path] = task
+            task.add_done_callback(lambda _t: Thumbs._tasks.pop(variant_path, None))
+        try:
+            variant_size = await asyncio.shield(task)
+        except Exception as e:
+            log(f"Thumbs: can't make {width}px variant of {path} ({repr(e)})", True)
+            variant_size = 0  # don't retry
+
+        if not variant_size:  # not smaller than the original or failed
+            Thumbs._originals[variant_path] = None
+            if len(Thumbs._originals) > Thumbs.MAX_ORIGINALS:
+                Thumbs._originals.popitem(last=False)
+            return path, size
+        if variant_path not in Thumbs._items:
+            Thumbs._add(variant_path, variant_size)
+        return variant_path, variant_size
+
+    @staticmethod
+    async def _make(path: str, size: int, variant_path: str, width: int) -> int:
+        """ Returns the variant size, 0 if it's not smaller than the original (the variant is not saved) """
+        os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+        tmp_path = f'{variant_path}.tmp.jpg'
+        try:
+            if Image:
+                await asyncio.to_thread(Thumbs._resize, path, tmp_path, width)
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-v', 'error', '-i', path, '-vf', f"scale='min(iw,{width})':-2", '-q:v', '5',
+                    '-y', tmp_path, stdin=asyncio.subprocess.DEVNULL)
+                try:
+                    code = await asyncio.wait_for(process.wait(), Thumbs.FFMPEG_TIMEOUT)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise
+                if code:
+                    raise RuntimeError(f'ffmpeg exit code {code}')
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        variant_size = os.stat(tmp_path).st_size
+        if variant_size >= size:
+            os.remove(tmp_path)
+            return 0
+        os.replace(tmp_path, variant_path)
+        return variant_size
+
+    @staticmethod
+    def _resize(path: str, variant_path: str, width: int) -> None:
+        with Image.open(path) as image:
+            image.draft('RGB', (width, width * image.height // image.width))  # fast JPEG decoding
+            image = image.convert('RGB')
+            image.thumbnail((width, image.height))
+            image.save(variant_path, 'JPEG', quality=Thumbs.QUALITY)
+
+    @staticmethod
+    def _add(variant_path: str, size: int) -> None:
+        Thumbs._items[variant_path] = size
+        Thumbs._size += size
+        while Thumbs._size > Thumbs.MAX_SIZE and len(Thumbs._items) > 1:
+            old_path, old_size = Thumbs._items.popitem(last=False)
+            Thumbs._size -= old_size
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _load(folder: str) -> None:
+        """ Restore the cache state, the last accessed variants are the most recently used """
+        items = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        items.append((stat.st_atime, entry.path, stat.st_size))
+        except FileNotFoundError:
+            return
+        for _atime, path, size in sorted(items):
+            if path.endswith('.tmp.jpg'):
+                os.remove(path)
+                continue
+            Thumbs._add(path, size)
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import const
+from _config import Config
+from inotify import Inotify, IN_CLOSE_WRITE, IN_MOVED_TO, IN_ONLYDIR, IN_IGNORED
+from segments import Segments
+from catalog import Catalog
+from log import log
+
+
+class Watcher:
+    """ Filesystem events listener.
+        Pushes video segments to the Segments index as soon as the storage command closes them.
+        Only the previous, current and next minute folders of each camera are watched.
+        Pushes uploaded event images to the Catalog, only the live events folder of each camera is watched.
+        Runs in the scheduler loop: the inotify descriptor is read by the loop reader callback.
+    """
+    UPDATE_INTERVAL = 1.0  # secs, watches update
+
+    def __init__(self):
+        self._inotify = None
+        self._watches = {}  # wd: (source, camera key, folder), source is "storage" or "events"
+        self._folders = {}  # (source, camera key, folder): wd
+        self._unwatched = set()  # (source, camera key) failed to watch, polled
+
+    async def run(self) -> None:
+        """ Infinite loop for the watches update, events are handled by the reader
+        """
+        try:
+            self._inotify = Inotify()
+        except OSError as e:
+            log(f"Watcher: can't start, live segments will be polled ({repr(e)})", True)
+            return
+
+        asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._read)
+        log('* Watcher: start')
+        while True:
+            try:
+                self._update_watches()
+            except Exception as e:
+                log(f'Watcher: {repr(e)}', True)
+            await asyncio.sleep(self.UPDATE_INTERVAL)
+
+    def _read(self) -> None:
+        try:
+            for wd, mask, name in self._inotify.read():
+                self._handle(wd, mask, name)
+        except Exception as e:
+            log(f'Watcher: {repr(e)}', True)
+
+    def _update_watches(self) -> None:
+        required = set()
+        if Config.storage_enabled or Config.web_enabled:
+            now = datetime.now()
+            minutes = [(now + timedelta(minutes=i)).strftime(const.DT_PATH_FORMAT) for i in (-1, 0, 1)]
+            required = {('storage', key, folder) for key in Config.cameras for folder in minutes}
+        if Config.events_enabled:
+            for key, cfg in Config.cameras.items():
+                folders = Catalog.get(key).get_folders() if cfg['events'] else []
+                if folders:
+                    required.add(('events', key, folders[-1]))
+
+        for item in list(self._folders):
+            if item not in required:
+                wd = self._folders.pop(item)
+                self._watches.pop(wd, None)
+                self._inotify.rm_watch(wd)
+
+        unwatched = set()
+        for item in required - self._folders.keys():
+            source, key, folder = item
+            root = Config.storage_path if source == 'storage' else Config.events_path
+            path = f"{root}/{Config.cameras[key]['folder']}/{folder}"
+            try:
+                wd = self._inotify.add_watch(path, IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR)
+            except FileNotFoundError:
+                continue  # not created yet
+            except OSError as e:  # e.g. the watches limit is reached, the camera folders are polled
+                if (source, key) not in self._unwatched | unwatched:
+                    log(f"Watcher: can't watch {path}, {source} {key} will be polled ({repr(e)})", True)
+                unwatched.add((source, key))
+                continue
+            self._watches[wd] = item
+            self._folders[item] = wd
+            if source == 'events':
+                Catalog.get(key).refresh(folder)  # images uploaded before the watch
+        for source, key in {(source, key) for source, key, _folder in required}:
+            (Segments.get(key) if source == 'storage' else Catalog.get(key)).watched = (source, key) not in unwatched
+        self._unwatched = unwatched
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_IGNORED:  # folder removed
+            item = self._watches.pop(wd, None)
+            if item:
+                self._folders.pop(item, None)
+            return
+
+        if wd not in self._watches or name.startswith('.'):
+            return
+
+        source, key, folder = self._watches[wd]
+        if source == 'events':
+            Catalog.get(key).close(folder, name)
+            return
+
+        if not name.endswith('.mp4'):
+            return
+        path = f"{Config.storage_path}/{Config.cameras[key]['folder']}/{folder}/{name}"
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return
+        Segments.get(key).close(path, size)
@@ -2,7 +2,6 @@ import asyncio
 import re
 import json
 import mimetypes
-from os import path as os_path
 from datetime import datetime
 
 import const
@@ -11,6 +10,10 @@ from response import Response
 from render import Render
 from videos import Videos
 from images import Images
+from thumbs import Thumbs
+from cache import Cache
+from assets import Assets
+from hub import Hub
 from share import Share
 from log import log
 
@@ -18,6 +21,8 @@ from log import log
 class Web(Response):
     """ Middleware (web request handler)
     """
+    SSE_PING_INTERVAL = 10  # secs
+    SSE_WRITE_TIMEOUT = 30  # secs, slow client is disconnected
 
     async def do_get(self) -> None:
         """ Router. Possible GET params: ?<page|video|image|chart|bell>=<val>[...]
@@ -79,26 +84,35 @@ class Web(Response):
 
     async def _send_webmanifest(self) -> None:
         static_file = '/app.webmanifest'
-        await self._set_static(static_file)
+        asset = Assets.get(static_file)
+        self.headers = [
+            f'Content-Type: {asset["mime"]}',
+            'Cache-Control: max-age=2592000'  # 30 days
+        ]
 
         render = Render(self.request['headers']['x-language'])
 
-        self.body = self.body.replace(
+        self.body = asset['bodies']['identity'].replace(
             b'{title}', render.app_title.encode('UTF-8')).replace(
             b'{network}', self._get_network_type().encode('UTF-8')).replace(
             b'{uri}', self.request['uri'].replace(static_file, '').encode('UTF-8'))
 
     async def _set_static(self, static_file: str) -> None:
-        try:
-            mime_type, _enc = mimetypes.MimeTypes().guess_type(static_file)
-            self.headers = [
-                f'Content-Type: {mime_type}',
-                'Cache-Control: max-age=2592000'  # 30 days
-            ]
-            self.body = await Response.read_file(
-                f'{os_path.dirname(os_path.realpath(__file__))}/../client{static_file}')
-        except Exception:
-            raise RuntimeError('Web: invalid static file', 404)
+        asset = Assets.get(static_file)
+        encoding = Assets.get_encoding(asset, self.request['headers'].get('accept-encoding', ''))
+        self.headers = [
+            f'Content-Type: {asset["mime"]}',
+            'Cache-Control: max-age=2592000',  # 30 days
+            f'ETag: {Assets.get_etag(asset, encoding)}',
+            'Vary: Accept-Encoding'
+        ]
+        if Assets.is_not_modified(asset, encoding, self.request['headers'].get('if-none-match', '')):
+            self.code = 304
+            return
+
+        if encoding != 'identity':
+            self.headers.append(f'Content-Encoding: {encoding}')
+        self.body = asset['bodies'][encoding]
 
     async def _send_page(self) -> None:
         self.headers = ['Content-Type: text/html; charset=utf-8']
@@ -120,7 +134,6 @@ class Web(Response):
             return
         self.headers = [
             'Content-Type: video/mp4',
-            f'Content-Length: {str(file_size)}',
             'Cache-Control: no-cache',
             f'X-Datetime: {file_date_time}',
             f'X-Range: {videos.get_range_by_path(file_path)}'
@@ -129,7 +142,11 @@ class Web(Response):
             self.headers += [
                 f'X-Codecs: {Config.cameras[key]['codecs']}',
                 f'X-Events: {int(Config.cameras[key]['events'])}']
-        self.body = await Response.read_file(file_path)
+        if videos.is_live():  # the same segment is requested by all the camera viewers
+            self.body = await Cache.get(key, file_path)
+        else:
+            self.file_path = file_path
+            self.file_size = file_size
 
     async def _send_image(self) -> None:
         key = self._get_key()
@@ -141,22 +158,28 @@ class Web(Response):
         if not file_size:
             return
 
-        mime_type, _enc = mimetypes.MimeTypes().guess_type(file_path)
+        mime_type, _enc = mimetypes.guess_type(file_path)
+        width = Thumbs.get_width(self.request['query'].get('w', [''])[0])
+        if width and mime_type == 'image/jpeg':  # variants are JPEG too
+            self.fallback_file = (file_path, file_size)  # the variant may be evicted before it's sent
+            file_path, file_size = await Thumbs.get(file_path, file_size, width)
+
         self.headers = [
             f'Content-Type: {mime_type}',
-            f'Content-Length: {str(file_size)}',
             'Cache-Control: no-cache',
             f'X-Range: {str(rng)}',
             f'X-Position: {position}',
         ]
-        self.body = await Response.read_file(file_path)
+        self.file_path = file_path
+        self.file_size = file_size
 
     async def _send_chart(self) -> None:
         key = self.request['query']['chart'][0]
         if not key or key not in Config.cameras:
             raise RuntimeError('Web: invalid chart key')
 
-        chart_data = Images(key).get_chart_data()
+        hourly = self.request['query'].get('hours', [''])[0] == '1'
+        chart_data = await asyncio.to_thread(Images(key).get_chart_data, hourly)  # may recount folders
 
         self.headers = ['Content-Type: application/json']
         self.body = json.dumps(chart_data).encode('UTF-8')
@@ -169,6 +192,8 @@ class Web(Response):
         if uid in Share.sse_clients:  # close previous connection & request for _loop_sse closing
             Share.sse_clients[uid].close_sse_connection = True
             Share.sse_clients[uid].close()
+            if Share.sse_clients[uid].sse_queue:
+                Hub.wake(Share.sse_clients[uid].sse_queue)
             log(f'SSE renew connection: {uid} {self._get_id(Share.sse_clients[uid])} -> {self._get_id(self)}')
 
         cams = await self._init_sse(keys)
@@ -202,45 +227,42 @@ class Web(Response):
         return cams
 
     async def _loop_sse(self, uid: str, cams: dict) -> str:
-        cnt = 0
-        last_times = {}
-
-        while not self.close_sse_connection:
-            try:
-                cnt = cnt + 1 if cnt < 10 else 1
-
-                if cnt % 2 == 0:  # check new motions every 2 secs (even cnt)
-                    bell_cams = {}
-                    for key in cams:
-                        if key not in Share.cam_motions:
-                            continue
-                        if key not in last_times:
-                            last_times[key] = Share.cam_motions[key]
-
-                        if Share.cam_motions[key] > last_times[key]:
-                            last_times[key] = Share.cam_motions[key]
-                            bell_cams[key] = self._get_bell_time(key)
-
-                    if bell_cams:
-                        data = {'action': 'bell', 'cams': bell_cams}
-                        body = (
-                            'event: message\r\n'
-                            'data: ' + json.dumps(data) + '\r\n\r\n').encode('UTF-8')
-
-                        await self.write(b'\r\n\r\n' + body)
-                        log(f'SSE bell: {uid} {list(bell_cams.keys())}')
-
-                if cnt == 10:  # ping client every 10 sesc & raise exception if connection lost
-                    await self.write(b'.')
-
-                await asyncio.sleep(1)
+        """ Push motion events published to Hub. The client is pinged if there are no events.
+        """
+        self.sse_queue = Hub.subscribe(set(cams))
+        try:
+            while not self.close_sse_connection:
+                try:
+                    event = await asyncio.wait_for(self.sse_queue.get(), self.SSE_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    # ping client & raise exception if connection lost
+                    await asyncio.wait_for(self.write(b'.'), self.SSE_WRITE_TIMEOUT)
+                    continue
+
+                bell_cams = {}
+                while event:  # collect all queued events
+                    bell_cams[event.camera] = self._get_bell_time(event.camera)
+                    event = self.sse_queue.get_nowait() if not self.sse_queue.empty() else None
+                if not bell_cams:
+                    continue  # woken up for closing
+
+                data = {'action': 'bell', 'cams': bell_cams}
+                body = (
+                    'event: message\r\n'
+                    'data: ' + json.dumps(data) + '\r\n\r\n').encode('UTF-8')
+
+                await asyncio.wait_for(self.write(b'\r\n\r\n' + body), self.SSE_WRITE_TIMEOUT)
+                log(f'SSE bell: {uid} {list(bell_cams.keys())}')
+
+        except Exception as e:
+            self.close()
+            return f'{uid} {self._get_id(self)} error: {repr(e)}'
 
-            except Exception as e:
-                self.close()
+        finally:
+            Hub.unsubscribe(self.sse_queue)
+            if Share.sse_clients.get(uid) is self:
                 del Share.sse_clients[uid]
-                return f'{uid} {self._get_id(self)} error: {e}'
 
-        del Share.sse_clients[uid]
         return f'{uid} {self._get_id(self)} close_sse_connection={self.close_sse_connection}'
 
     @staticmethod
@@ -249,9 +271,10 @@ class Web(Response):
 
     @staticmethod
     def _get_bell_time(key) -> str:
-        if key not in Share.cam_motions:
+        event = Hub.get_last(key)
+        if not event:
             return ''
-        last_bell_datetime = datetime.strptime(Share.cam_motions[key], const.DT_WEB_FORMAT)
+        last_bell_datetime = datetime.strptime(event.date_time, const.DT_WEB_FORMAT)
         if (datetime.now() - last_bell_datetime).total_seconds() > 43200:  # not older than 12 hours
             return ''
         return last_bell_datetime.strftime(const.DT_WEB_FORMAT)